@@ -1,29 +1,78 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, g
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 import MySQLdb
 import bcrypt
 from config import Config
 from flask_bcrypt import Bcrypt
 from flask import jsonify
+from markupsafe import Markup
 from datetime import datetime
+import math
+import os
+from jinja2 import FileSystemBytecodeCache
+import assets
+import db_router
+import fragments
+import invalidation
+import jobs
+import profiler
+import repositories
+import snapshot
+import transactions
+from throttle import account_key, create_login_throttle
 
 app = Flask(__name__)
 app.config.from_object(Config)
 #bcrypt = Bcrypt(app)
 
+# Keep compiled templates on disk so new workers skip recompiling them
+os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+app.jinja_options = {**app.jinja_options,
+                     'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])}
+
+# Rendered panel/team/student tables, keyed on the data version of their tables
+fragment_cache = fragments.FragmentCache(app.config['FRAGMENT_CACHE_SIZE'])
+
+# Hear about writes made by other workers (see invalidation.py)
+@app.before_request
+def start_invalidation_listener():
+    invalidation.ensure_listener(app.config)
+
 # Set up Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'student_login'  # Default login view
 
-# Database connection
+# Per-IP and per-account throttling of login attempts
+login_throttle = create_login_throttle(app.config)
+
+# Fingerprinted static assets and response compression
+assets.init_app(app)
+
+# On-demand request tracing, admins can ask for a trace of any request
+slow_traces = profiler.init_app(app, allow=lambda: is_admin())
+
+# Database connection (read-only routes go to a replica when one is configured)
 def connect_db():
-    return MySQLdb.connect(
-        host=app.config['DB_HOST'],
-        user=app.config['DB_USER'],
-        passwd=app.config['DB_PASSWORD'],
-        db=app.config['DB_NAME']
-    )
+    with profiler.span('connect'):
+        if db_router.is_read_only_request():
+            db = db_router.connect_replica(app.config)
+        else:
+            db = db_router.connect_primary(app.config)
+    return profiler.instrument(db)
+
+# Result-day dashboard reads, see snapshot.py
+dashboard_snapshot = snapshot.init_app(app)
+DASHBOARD_ENDPOINTS = {'student_dashboard', 'faculty_dashboard'}
+
+def connect_dashboard_db():
+    # The local snapshot when snapshot mode is on and it is fresh enough, else MySQL
+    if app.config['SNAPSHOT_MODE']:
+        db = dashboard_snapshot.connect()
+        if db is not None:
+            g.snapshot_age = db.age
+            return db
+    return connect_db()
 
 class User(UserMixin):
     def __init__(self, srn=None, faculty_id=None, admin_id=None):
@@ -42,26 +91,30 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    db = connect_db()
+    # Dashboards check students and faculty against the snapshot so they keep
+    # working while MySQL is down. A deleted account can open its dashboard
+    # until the snapshot is older than SNAPSHOT_MAX_STALENESS, every other
+    # page checks MySQL.
+    db = connect_dashboard_db() if request.endpoint in DASHBOARD_ENDPOINTS else connect_db()
     cursor = db.cursor()
     
     # Check if the user is a student
-    cursor.execute("SELECT * FROM Student WHERE SRN = %s", (user_id,))
-    student = cursor.fetchone()
-    if student:
-        return User(srn=student[0])  # Assuming SRN is the first column
+    if repositories.student_exists(cursor, user_id):
+        return User(srn=user_id)
 
     # Check if the user is a faculty member
-    cursor.execute("SELECT * FROM Faculty WHERE FacultyID = %s", (user_id,))
-    faculty = cursor.fetchone()
-    if faculty:
-        return User(faculty_id=faculty[0])  # Assuming FacultyID is the first column
+    if repositories.faculty_exists(cursor, user_id):
+        return User(faculty_id=user_id)
 
-    # Check if the user is an admin
-    cursor.execute("SELECT * FROM Admin WHERE AdminID = %s", (user_id,))
-    admin = cursor.fetchone()
-    if admin:
-        return User(admin_id=admin[0])  # Assuming AdminID is the first column
+    # Check if the user is an admin, admins are only in MySQL
+    if isinstance(db, snapshot.SnapshotConnection):
+        try:
+            db = connect_db()
+        except MySQLdb.OperationalError:
+            return None  # MySQL is down, treat as logged out rather than fail the dashboard
+        cursor = db.cursor()
+    if repositories.admin_exists(cursor, user_id):
+        return User(admin_id=user_id)
 
     return None
 
@@ -76,21 +129,29 @@ def student_login():
         email = request.form['email']
         password = request.form['password']
 
+        # Reject throttled attempts before any DB or bcrypt work
+        account = account_key('student', email)
+        if not login_throttle.allow(request.remote_addr, account):
+            flash('Too many login attempts, please wait and try again.', 'danger')
+            return render_template('login.html'), 429
+
         db = connect_db()
         cursor = db.cursor()
-        cursor.execute("SELECT * FROM Student WHERE Email = %s", (email,))
-        student = cursor.fetchone()
+        student = repositories.student_login(cursor, email)
 
         if student:
-            # The password is stored in the 12th column, adjust accordingly
-            stored_password = student[11].encode('utf-8')  # Convert stored hash to bytes
-            if bcrypt.checkpw(password.encode('utf-8'), stored_password):  # Compare hash
-                user = User(srn=student[0])  # Assuming SRN is the first column
+            stored_password = student.password.encode('utf-8')  # Convert stored hash to bytes
+            with profiler.span('bcrypt'):
+                password_ok = bcrypt.checkpw(password.encode('utf-8'), stored_password)
+            if password_ok:  # Compare hash
+                user = User(srn=student.srn)
                 login_user(user)
-                return redirect(url_for('student_dashboard', srn=student[0]))
+                return redirect(url_for('student_dashboard', srn=student.srn))
             else:
+                login_throttle.failed(account)
                 flash('Invalid credentials, please try again.', 'danger')
         else:
+            login_throttle.failed(account)
             flash('Invalid credentials, please try again.', 'danger')
 
     return render_template('login.html')
@@ -143,7 +204,9 @@ def student_register():
                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
                        (srn, name, email, phone, gender, section, semester, gpa, deptid, teamid, facultyid, hashed_password.decode('utf-8')))
 
+        invalidation.record_change(cursor, 'Student')
         db.commit()
+        fragments.bump('Student')
         flash('Registration successful! You can now log in.', 'success')
         return redirect(url_for('student_login'))
 
@@ -155,17 +218,25 @@ def faculty_login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
+
+        # Reject throttled attempts before any DB or bcrypt work
+        account = account_key('faculty', email)
+        if not login_throttle.allow(request.remote_addr, account):
+            flash('Too many login attempts, please wait and try again.', 'danger')
+            return render_template('faculty_login.html'), 429
         
         db = connect_db()
         cursor = db.cursor()
-        cursor.execute("SELECT * FROM Faculty WHERE Email = %s", (email,))
-        faculty = cursor.fetchone()
+        faculty = repositories.faculty_login(cursor, email)
         
-        if faculty and bcrypt.checkpw(password.encode('utf-8'), faculty[4].encode('utf-8')):  # Assuming password is the fifth column
-            user = User(faculty_id=faculty[0])  # Assuming FacultyID is the first column
+        with profiler.span('bcrypt'):
+            password_ok = faculty and bcrypt.checkpw(password.encode('utf-8'), faculty.password.encode('utf-8'))
+        if password_ok:
+            user = User(faculty_id=faculty.faculty_id)
             login_user(user)
-            return redirect(url_for('faculty_dashboard', faculty_id=faculty[0]))
+            return redirect(url_for('faculty_dashboard', faculty_id=faculty.faculty_id))
         else:
+            login_throttle.failed(account)
             flash('Invalid credentials, please try again.', 'danger')
     
     return render_template('faculty_login.html')
@@ -199,7 +270,9 @@ def faculty_register():
             "INSERT INTO Faculty (FacultyName, Designation, Email, Password, PanelID) VALUES (%s, %s, %s, %s, %s)",
             (name, designation, email, hashed_password.decode('utf-8'), panel_id)
         )
+        invalidation.record_change(cursor, 'Faculty')
         db.commit()
+        fragments.bump('Faculty')
         flash('Registration successful! You can now log in.', 'success')
         return redirect(url_for('faculty_login'))
     
@@ -211,17 +284,25 @@ def admin_login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
+
+        # Reject throttled attempts before any DB or bcrypt work
+        account = account_key('admin', email)
+        if not login_throttle.allow(request.remote_addr, account):
+            flash('Too many login attempts, please wait and try again.', 'danger')
+            return render_template('admin_login.html'), 429
         
         db = connect_db()
         cursor = db.cursor()
-        cursor.execute("SELECT * FROM Admin WHERE Email = %s", (email,))
-        admin = cursor.fetchone()
+        admin = repositories.admin_login(cursor, email)
         
-        if admin and bcrypt.checkpw(password.encode('utf-8'), admin[3].encode('utf-8')):  # Assuming password is the fourth column
-            user = User(admin_id=admin[0])  # Assuming AdminID is the first column
+        with profiler.span('bcrypt'):
+            password_ok = admin and bcrypt.checkpw(password.encode('utf-8'), admin.password.encode('utf-8'))
+        if password_ok:
+            user = User(admin_id=admin.admin_id)
             login_user(user)  # Create the user session
             return redirect(url_for('admin_dashboard'))  # Redirect to admin dashboard
         else:
+            login_throttle.failed(account)
             flash('Invalid credentials, please try again.', 'danger')
     
     return render_template('admin_login.html')
@@ -236,7 +317,11 @@ def admin_dashboard():
 @app.route('/student_dashboard/<srn>')
 @login_required
 def student_dashboard(srn):
-    db = connect_db()
+    # Earlier terms are only read from the archive tables when asked for
+    include_archived = request.args.get('history') == '1'
+
+    # The snapshot holds the current term only
+    db = connect_db() if include_archived else connect_dashboard_db()
     cursor = db.cursor()
 
     # Query for team information
@@ -250,9 +335,7 @@ def student_dashboard(srn):
     teammates = cursor.fetchall()
 
     # Query for exam results
-    cursor.execute("SELECT Exam.ExamID, Exam.ExamName, CapstoneMarks.TotalMarks FROM Exam "
-                   "JOIN CapstoneMarks ON Exam.ExamID = CapstoneMarks.ExamID WHERE CapstoneMarks.SRN = %s", (srn,))
-    exam_results = cursor.fetchall()
+    exam_results = repositories.exam_results_for(cursor, srn, include_archived)
 
     # Query for upcoming exams
     current_date = datetime.now().date()
@@ -262,12 +345,12 @@ def student_dashboard(srn):
     upcoming_exams = cursor.fetchall()
 
     # Query for semester grades from StudentGrades
-    cursor.execute("SELECT Semester, Total_marks_in_sem, Grade FROM StudentGrades WHERE SRN = %s", (srn,))
-    semester_grades = cursor.fetchall()
+    semester_grades = repositories.grades_for(cursor, srn, include_archived)
 
     return render_template('student_dashboard.html', team_project_name=team_project_name,
                            teammates=teammates, exam_results=exam_results,
-                           upcoming_exams=upcoming_exams, semester_grades=semester_grades)
+                           upcoming_exams=upcoming_exams, semester_grades=semester_grades,
+                           srn=srn, include_archived=include_archived)
 
 
 
@@ -275,7 +358,7 @@ def student_dashboard(srn):
 @app.route('/faculty_dashboard/<faculty_id>')
 @login_required
 def faculty_dashboard(faculty_id):
-    db = connect_db()
+    db = connect_dashboard_db()
     cursor = db.cursor()
 
     # Query for teams and students under the faculty's supervision
@@ -330,28 +413,26 @@ def manage_teams():
                 cursor.execute("UPDATE Student SET FacultyID = %s WHERE TeamID = %s", (faculty_id, new_team_id))
             flash('Team added successfully!', 'success')
 
+        invalidation.record_change(cursor, 'Team', 'Student')
         db.commit()
+        fragments.bump('Team', 'Student')
 
-    # Retrieve the current teams with department and supervising faculty details
-    cursor.execute("""
-    SELECT Team.TeamID, Team.ProjectName, Team.Domain, Team.DeptID, Faculty.FacultyName
-    FROM Team
-    LEFT JOIN (
-        SELECT DISTINCT TeamID, FacultyID FROM Student
-    ) AS student_faculty ON Team.TeamID = student_faculty.TeamID
-    LEFT JOIN Faculty ON student_faculty.FacultyID = Faculty.FacultyID
-    """)
-    teams = cursor.fetchall()
+    def render_team_table():
+        # Retrieve the current teams with department and supervising faculty details
+        teams = repositories.list_teams(cursor)
+        return render_template('fragments/team_table.html', teams=teams)
+
+    team_table = fragment_cache.get_or_render('team_table', ('Team', 'Student', 'Faculty'), render_team_table,
+                                              store=db_router.is_primary(db))
 
     # Retrieve departments for the dropdown
-    cursor.execute("SELECT * FROM Department")
-    departments = cursor.fetchall()
+    departments = repositories.list_departments(cursor)
 
     # Retrieve faculties for the dropdown
     cursor.execute("SELECT FacultyID, FacultyName FROM Faculty")
     faculties = cursor.fetchall()
 
-    return render_template('manage_teams.html', teams=teams, departments=departments, faculties=faculties)
+    return render_template('manage_teams.html', team_table=team_table, departments=departments, faculties=faculties)
 
 # Route to delete a team
 @app.route('/delete_team/<int:team_id>', methods=['POST'])
@@ -360,11 +441,11 @@ def delete_team(team_id):
         flash('You must be an admin to perform this action.', 'error')
         return redirect(url_for('manage_teams'))
 
+    # Deleting a team cascades to its exams, so it runs as a background job
     db = connect_db()
-    cursor = db.cursor()
-    cursor.execute("DELETE FROM Team WHERE TeamID = %s", (team_id,))
-    db.commit()
-    flash('Team deleted successfully!', 'success')
+    job_id = jobs.enqueue(db, 'delete_team', {'team_id': team_id}, created_by=current_user.admin_id)
+    db.close()
+    flash(f'Team deletion queued (job #{job_id}).', 'success')
     return redirect(url_for('manage_teams'))
 
 # Update team route
@@ -390,8 +471,10 @@ def update_team(team_id):
     if faculty_id:
         cursor.execute("UPDATE Student SET FacultyID = %s WHERE TeamID = %s", (faculty_id, team_id))
 
+    invalidation.record_change(cursor, 'Team', 'Student')
     conn.commit()
     conn.close()
+    fragments.bump('Team', 'Student')
     flash('Team updated successfully!')
     return redirect(url_for('manage_teams'))
 
@@ -432,38 +515,44 @@ def manage_panels():
                                (panel_name, dept_id))
                 flash('Panel added successfully!', 'success')
 
+            invalidation.record_change(cursor, 'Panel')
             db.commit()
+            fragments.bump('Panel')
 
         # Redirect to the same page to prevent resubmission (PRG Pattern)
         return redirect(url_for('manage_panels'))
 
     # Retrieve the current panels and departments for the dropdown
-    cursor.execute("SELECT * FROM Panel")
-    panels = cursor.fetchall()
+    panels = repositories.list_panels(cursor)
+    departments = repositories.list_departments(cursor)
 
-    cursor.execute("SELECT * FROM Department")
-    departments = cursor.fetchall()
+    def render_panel_table():
+        # Retrieve faculties for each panel
+        cursor.execute("""
+            SELECT p.PanelID, f.FacultyID, f.FacultyName, f.Designation
+            FROM Panel p
+            LEFT JOIN Faculty f ON p.PanelID = f.PanelID
+            ORDER BY p.PanelID
+        """)
+        panel_faculty = cursor.fetchall()
+
+        # Organize faculties by panel ID
+        panel_faculty_dict = {}
+        for panel_id, faculty_id, faculty_name, designation in panel_faculty:
+            if panel_id not in panel_faculty_dict:
+                panel_faculty_dict[panel_id] = []
+            if faculty_id:
+                panel_faculty_dict[panel_id].append({
+                    'FacultyID': faculty_id,
+                    'FacultyName': faculty_name,
+                    'Designation': designation
+                })
 
-    # Retrieve faculties for each panel
-    cursor.execute("""
-        SELECT p.PanelID, f.FacultyID, f.FacultyName, f.Designation
-        FROM Panel p
-        LEFT JOIN Faculty f ON p.PanelID = f.PanelID
-        ORDER BY p.PanelID
-    """)
-    panel_faculty = cursor.fetchall()
-
-    # Organize faculties by panel ID
-    panel_faculty_dict = {}
-    for panel_id, faculty_id, faculty_name, designation in panel_faculty:
-        if panel_id not in panel_faculty_dict:
-            panel_faculty_dict[panel_id] = []
-        if faculty_id:
-            panel_faculty_dict[panel_id].append({
-                'FacultyID': faculty_id,
-                'FacultyName': faculty_name,
-                'Designation': designation
-            })
+        return render_template('fragments/panel_table.html', panels=panels,
+                               panel_faculty_dict=panel_faculty_dict)
+
+    panel_table = fragment_cache.get_or_render('panel_table', ('Panel', 'Faculty'), render_panel_table,
+                                               store=db_router.is_primary(db))
 
     # Check faculties for a specific panel ID if provided
     check_panel_id = request.args.get('check_panel_id')
@@ -476,7 +565,7 @@ def manage_panels():
     db.close()  # Close the database connection
 
     return render_template('manage_panels.html', panels=panels, departments=departments,
-                           panel_faculty_dict=panel_faculty_dict, faculties=faculties,
+                           panel_table=panel_table, faculties=faculties,
                            check_panel_id=check_panel_id)
 
 @app.route('/delete_panel/<int:panel_id>', methods=['POST'])
@@ -490,7 +579,9 @@ def delete_panel(panel_id):
     cursor = db.cursor()
     try:
         cursor.execute("DELETE FROM Panel WHERE PanelID = %s", (panel_id,))
+        invalidation.record_change(cursor, 'Panel')
         db.commit()
+        fragments.bump('Panel')
         flash('Panel deleted successfully!', 'success')
     except:
         db.rollback()
@@ -522,7 +613,9 @@ def update_faculty():
             SET FacultyName = %s, Designation = %s, PanelID = %s 
             WHERE FacultyID = %s
         """, (faculty_name, designation, panel_id, faculty_id))
+        invalidation.record_change(cursor, 'Faculty')
         db.commit()
+        fragments.bump('Faculty')
         flash('Faculty updated successfully!', 'success')
     except:
         db.rollback()
@@ -576,16 +669,18 @@ def schedule_exams():
 
         # Insert new exam into the database
         cursor.execute(
-            "INSERT INTO Exam (ExamName, MaxMarksAllotted, exam_date, exam_time, TeamID) VALUES (%s, %s, %s, %s, %s)",
-            (exam_name, max_marks, exam_date, exam_time, team_id)
+            "INSERT INTO Exam (ExamName, MaxMarksAllotted, exam_date, exam_time, TeamID, Term) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (exam_name, max_marks, exam_date, exam_time, team_id, app.config['CURRENT_TERM'])
         )
+        invalidation.record_change(cursor, 'Exam')
         db.commit()
+        fragments.bump('Exam')
         flash('Exam scheduled successfully!', 'success')
         return redirect(url_for('schedule_exams'))
 
     # Fetch all scheduled exams, sorted by ExamID in descending order
-    cursor.execute("SELECT ExamID, ExamName, MaxMarksAllotted, exam_date, exam_time, TeamID FROM Exam ORDER BY ExamID DESC")
-    exams = cursor.fetchall()
+    exams = repositories.list_exams(cursor)
     db.close()
 
     return render_template('schedule_exam.html', exams=exams)
@@ -610,18 +705,34 @@ def marks_entry():
         faculty_id = request.form['faculty_id']
         marks_obtained = request.form['marks_obtained']
         
+        def insert_marks(cursor):
+            repositories.insert_marks(cursor, srn, exam_id, faculty_id, marks_obtained)
+            # The Undergoes triggers also write CapstoneMarks and StudentGrades
+            invalidation.record_change(cursor, 'Undergoes', 'CapstoneMarks', 'StudentGrades')
+
         try:
-            cursor.execute("""
-                INSERT INTO undergoes (SRN, ExamID, FacultyID, MarksObtained)
-                VALUES (%s, %s, %s, %s)
-            """, (srn, exam_id, faculty_id, marks_obtained))
-            conn.commit()
+            # Panel members often submit for the same student at once, retry lock conflicts
+            _, stats = transactions.run_in_transaction(
+                conn, insert_marks,
+                isolation=app.config['MARKS_ISOLATION_LEVEL'],
+                lock_wait_timeout=app.config['MARKS_LOCK_WAIT_TIMEOUT'],
+                max_attempts=app.config['TRANSACTION_MAX_ATTEMPTS'],
+                base_delay=app.config['TRANSACTION_RETRY_BASE_DELAY'],
+                max_delay=app.config['TRANSACTION_RETRY_MAX_DELAY'])
+            if stats.retries:
+                app.logger.info("Marks entry for %s retried %d times (%d deadlocks, %d lock timeouts, "
+                                "%.3fs lost)", srn, stats.retries, stats.deadlocks, stats.lock_timeouts,
+                                stats.failed_time + stats.backoff_time)
+            fragments.bump('Undergoes', 'CapstoneMarks', 'StudentGrades')
             flash("Marks submitted successfully!", "success")
         except MySQLdb.IntegrityError as e:
             if 'foreign key constraint fails' in str(e):
                 flash("Error: Invalid SRN, Exam ID, or Faculty ID. Please check and try again.", "danger")
             else:
                 flash("An unexpected error occurred. Please try again later.", "danger")
+        except MySQLdb.OperationalError as e:
+            app.logger.warning("Marks entry for %s failed: %s", srn, e)
+            flash("The marks could not be saved because the database is busy. Please try again.", "danger")
         finally:
             cursor.close()
             conn.close()
@@ -640,19 +751,16 @@ def marks_entry():
 def search_marks():
     srn = request.form['search_srn']
     exam_id = request.form['search_exam_id']
+    include_archived = 'include_archived' in request.form
 
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT FacultyID, MarksObtained
-        FROM Undergoes
-        WHERE SRN = %s AND ExamID = %s
-    """, (srn, exam_id))
-    results = cursor.fetchall()
+    results = repositories.marks_for(cursor, srn, exam_id, include_archived)
     cursor.close()
     conn.close()
 
-    return render_template('marks_entry.html', results=results, search_srn=srn, search_exam_id=exam_id)
+    return render_template('marks_entry.html', results=results, search_srn=srn, search_exam_id=exam_id,
+                           include_archived=include_archived)
 
 
 # Route for viewing all students
@@ -666,11 +774,15 @@ def student_details():
     db = connect_db()
     cursor = db.cursor()
     
-    cursor.execute("SELECT * FROM Student")
-    students = cursor.fetchall()
+    def render_student_table():
+        students = repositories.list_students(cursor)
+        return render_template('fragments/student_table.html', students=students)
+
+    student_table = fragment_cache.get_or_render('student_table', ('Student',), render_student_table,
+                                                 store=db_router.is_primary(db))
     db.close()
     
-    return render_template('student_details.html', students=students)
+    return render_template('student_details.html', student_table=student_table)
 
 # Route to search for a specific student by SRN
 @app.route('/search_student', methods=['GET'])
@@ -684,13 +796,12 @@ def search_student():
     
     db = connect_db()
     cursor = db.cursor()
-    cursor.execute("SELECT * FROM Student WHERE SRN = %s", (srn,))
-    student = cursor.fetchone()
+    students = repositories.students_by_srns(cursor, [srn]) if srn else []
     db.close()
     
-    students = [student] if student else []  # Return as a list for consistency with the template
+    student_table = render_template('fragments/student_table.html', students=students)
     
-    return render_template('student_details.html', students=students)
+    return render_template('student_details.html', student_table=Markup(student_table))
 
 # Route to fetch a student's data for updating
 @app.route('/get_student_data/<srn>', methods=['GET'])
@@ -701,27 +812,12 @@ def get_student_data(srn):
 
     db = connect_db()
     cursor = db.cursor()
-    cursor.execute("SELECT SRN, Name, Email, Phone, Gender, Section, Semester, GPA, DeptID, TeamID, FacultyID, Password FROM Student WHERE SRN = %s", (srn,))
-    student = cursor.fetchone()
+    students = repositories.students_by_srns(cursor, [srn])
     db.close()
 
-    if student:
-        # Convert the result into a dictionary for easier access in the frontend
-        student_data = {
-            'srn': student[0],
-            'name': student[1],
-            'email': student[2],
-            'phone': student[3],
-            'gender': student[4],
-            'section': student[5],
-            'semester': student[6],
-            'gpa': student[7],
-            'deptID': student[8],
-            'teamID': student[9],
-            'facultyID': student[10],
-            'password': student[11]
-        }
-        return jsonify(student_data)
+    if students:
+        # Never send the password hash to the browser
+        return jsonify(student_json(students[0]))
     else:
         return jsonify({'message': 'Student not found'}), 404
 
@@ -746,19 +842,21 @@ def update_student_ajax():
     facultyid = data.get('facultyID')
     password = data.get('password')
 
+    fields = {'name': name, 'email': email, 'phone': phone, 'gender': gender, 'section': section,
+              'semester': semester, 'gpa': gpa, 'deptID': deptid, 'teamID': teamid, 'facultyID': facultyid}
+    # A blank password keeps the current one, as in the batch update
+    if isinstance(password, str) and password:
+        salt = bcrypt.gensalt()  # Generate a salt
+        fields['password'] = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
     db = connect_db()
     cursor = db.cursor()
-
-    salt = bcrypt.gensalt()  # Generate a salt
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-
-    cursor.execute("""UPDATE Student SET Name=%s, Email=%s, Phone=%s, Gender=%s, 
-                      Section=%s, Semester=%s, GPA=%s, DeptID=%s, TeamID=%s, FacultyID=%s, Password=%s 
-                      WHERE SRN=%s""",
-                   (name, email, phone, gender, section, semester, gpa, deptid, teamid, facultyid, hashed_password.decode('utf-8'), srn))
+    repositories.update_students(cursor, [srn], fields)
     
+    invalidation.record_change(cursor, 'Student')
     db.commit()
     db.close()
+    fragments.bump('Student')
     
     return jsonify({'message': 'Student updated successfully!'})
 
@@ -775,9 +873,11 @@ def delete_student_ajax():
         db = connect_db()
         cursor = db.cursor()
         cursor.execute("DELETE FROM Student WHERE SRN = %s", (srn,))
+        invalidation.record_change(cursor, 'Student')
         db.commit()
         cursor.close()
         db.close()
+        fragments.bump('Student')
         return jsonify({'message': 'Student deleted successfully!'})
     except Exception as e:
         print(f"Error: {e}")
@@ -796,11 +896,9 @@ def faculty_details():
     cursor = db.cursor()
 
     if faculty_id:  # If a Faculty ID is provided, search for that specific faculty
-        cursor.execute("SELECT * FROM Faculty WHERE FacultyID = %s", (faculty_id,))
-        faculties = cursor.fetchall()
+        faculties = repositories.faculty_by_ids(cursor, [faculty_id])
     else:  # Otherwise, retrieve all faculty records
-        cursor.execute("SELECT * FROM Faculty")
-        faculties = cursor.fetchall()
+        faculties = repositories.list_faculty(cursor)
     
     db.close()
     
@@ -815,20 +913,11 @@ def get_faculty_data(faculty_id):
 
     db = connect_db()
     cursor = db.cursor()
-    cursor.execute("SELECT FacultyID, FacultyName, Designation, PanelID, email, Password FROM Faculty WHERE FacultyID = %s", (faculty_id,))
-    faculty = cursor.fetchone()
+    faculty = repositories.faculty_by_ids(cursor, [faculty_id])
     db.close()
 
     if faculty:
-        faculty_data = {
-            'faculty_id': faculty[0],
-            'name': faculty[1],
-            'designation': faculty[2],
-            'panel_id': faculty[3],
-            'email':faculty[4],
-            'password':faculty[5]
-        }
-        return jsonify(faculty_data)
+        return jsonify(faculty_json(faculty[0]))
     else:
         return jsonify({'message': 'Faculty not found'}), 404
 
@@ -850,12 +939,16 @@ def update_faculty_ajax():
     try:
         db = connect_db()
         cursor = db.cursor()
-        salt = bcrypt.gensalt()  # Generate a salt
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-        cursor.execute("""UPDATE Faculty SET FacultyName=%s, Designation=%s, PanelID=%s, email=%s, Password=%s WHERE FacultyID=%s""",
-                       (name, designation, panel_id, email, hashed_password.decode('utf-8'), faculty_id))
+        fields = {'name': name, 'designation': designation, 'panel_id': panel_id, 'email': email}
+        # A blank password keeps the current one, as in the batch update
+        if isinstance(password, str) and password:
+            salt = bcrypt.gensalt()  # Generate a salt
+            fields['password'] = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        repositories.update_faculty(cursor, [faculty_id], fields)
+        invalidation.record_change(cursor, 'Faculty')
         db.commit()
         db.close()
+        fragments.bump('Faculty')
 
         # Send a JSON response with success message
         return jsonify({'message': 'Faculty updated successfully!', 'success': True})
@@ -874,8 +967,10 @@ def delete_faculty(faculty_id):
     db = connect_db()
     cursor = db.cursor()
     cursor.execute("DELETE FROM Faculty WHERE FacultyID = %s", (faculty_id,))
+    invalidation.record_change(cursor, 'Faculty')
     db.commit()
     db.close()
+    fragments.bump('Faculty')
     
     flash('Faculty deleted successfully!', 'success')
     return redirect(url_for('faculty_details'))
@@ -894,15 +989,371 @@ def delete_faculty_ajax():
         db = connect_db()
         cursor = db.cursor()
         cursor.execute("DELETE FROM Faculty WHERE FacultyID = %s", (faculty_id,))
+        invalidation.record_change(cursor, 'Faculty')
         db.commit()
         db.close()
+        fragments.bump('Faculty')
 
         # Send a JSON response with success message
         return jsonify({'message': 'Faculty deleted successfully!'})
     except Exception as e:
         print("Error deleting faculty:", e)  # Log error for debugging
         return jsonify({'message': 'Failed to delete faculty'}), 500
-    
+
+
+# --- Batch endpoints for multi-select admin operations ---
+# One request and one transaction for the whole selection. Writes report a
+# result per item: an item that fails is rolled back to its savepoint and the
+# rest of the batch still commits.
+
+BATCH_ERROR_MESSAGES = {
+    1062: 'Another record already uses this value',
+    1451: 'Still referenced by other records',
+    1452: 'Refers to a department, team, panel or faculty that does not exist',
+}
+
+def student_json(student):
+    return {'srn': student.srn, 'name': student.name, 'email': student.email, 'phone': student.phone,
+            'gender': student.gender, 'section': student.section, 'semester': student.semester,
+            'gpa': student.gpa, 'deptID': student.dept_id, 'teamID': student.team_id,
+            'facultyID': student.faculty_id}
+
+def faculty_json(faculty):
+    return {'faculty_id': faculty.faculty_id, 'name': faculty.name, 'designation': faculty.designation,
+            'panel_id': faculty.panel_id, 'email': faculty.email}
+
+def batch_keys(values, convert):
+    # Deduplicated keys from a JSON list, None when the list is missing or malformed
+    if not isinstance(values, list) or not values:
+        return None
+    try:
+        return list(dict.fromkeys(convert(value) for value in values))
+    except (TypeError, ValueError):
+        return None
+
+def batch_item_result(key_name, key, error=None, status='ok'):
+    if error is not None:
+        code = error.args[0] if error.args else None
+        return {key_name: key, 'status': 'failed', 'message': BATCH_ERROR_MESSAGES.get(code, 'Invalid value')}
+    return {key_name: key, 'status': status}
+
+def run_batch(work):
+    db = connect_db()
+    try:
+        result, _ = transactions.run_in_transaction(
+            db, work,
+            max_attempts=app.config['TRANSACTION_MAX_ATTEMPTS'],
+            base_delay=app.config['TRANSACTION_RETRY_BASE_DELAY'],
+            max_delay=app.config['TRANSACTION_RETRY_MAX_DELAY'])
+        return result
+    finally:
+        db.close()
+
+def batch_fields(item, columns, numeric):
+    # The fields of one batch item that may be written, numbers parsed.
+    # Raises ValueError with the field name when a value has the wrong type.
+    fields = {}
+    for name, value in item.items():
+        if name not in columns:
+            continue
+        if value is not None:
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise ValueError(name)
+            if name == 'password' and not isinstance(value, str):
+                raise ValueError(name)
+            if name in numeric:
+                try:
+                    # Through str() so 3.7 is refused for an integer field instead of truncated
+                    value = numeric[name](str(value).strip())
+                except ValueError:
+                    raise ValueError(name) from None
+                if not math.isfinite(value):
+                    raise ValueError(name)
+        fields[name] = value
+    return fields
+
+def batch_update(items, key_name, convert, columns, numeric, fetch_existing, update, table):
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Expected a non-empty list of records'}), 400
+    if len(items) > app.config['ADMIN_BATCH_MAX_ITEMS']:
+        return jsonify({'message': f"At most {app.config['ADMIN_BATCH_MAX_ITEMS']} records per request"}), 413
+
+    # Validate everything before the transaction, bad values never reach MySQL
+    results = [None] * len(items)
+    updates = []  # (index, key, fields)
+    for index, item in enumerate(items):
+        try:
+            key = convert(item[key_name])
+        except (TypeError, KeyError, ValueError):
+            results[index] = {key_name: None, 'status': 'invalid', 'message': f'Missing {key_name}'}
+            continue
+        try:
+            fields = batch_fields(item, columns, numeric)
+        except ValueError as e:
+            results[index] = {key_name: key, 'status': 'invalid', 'message': f'Invalid value for {e}'}
+            continue
+        updates.append((index, key, fields))
+
+    max_passwords = app.config['ADMIN_BATCH_MAX_PASSWORDS']
+    if sum(1 for _, _, fields in updates if fields.get('password')) > max_passwords:
+        return jsonify({'message': f"At most {max_passwords} password changes per request"}), 413
+
+    # Hash passwords before the transaction so no locks are held meanwhile
+    valid = []
+    for index, key, fields in updates:
+        if fields.get('password'):
+            fields['password'] = bcrypt.hashpw(fields['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        else:
+            fields.pop('password', None)  # Blank password means keep the current one
+        if not fields:
+            results[index] = {key_name: key, 'status': 'invalid', 'message': 'Nothing to update'}
+            continue
+        valid.append((index, key, fields))
+    updates = valid
+
+    def work(cursor):
+        existing = fetch_existing(cursor, [key for _, key, _ in updates]) if updates else set()
+        # Items setting the same values share one UPDATE ... WHERE key IN (...).
+        # The bulk modal sends the same fields for every selected row, so that
+        # is usually a single statement. Passwords are salted per item and
+        # never group.
+        groups = {}
+        for u in updates:
+            if u[1] in existing:
+                groups.setdefault(tuple(sorted(u[2].items())), []).append(u)
+        batch_results = {index: batch_item_result(key_name, key, status='not_found')
+                         for index, key, _ in updates if key not in existing}
+        for group in groups.values():
+            errors = transactions.apply_batch(cursor, group,
+                                              lambda cursor, us: update(cursor, [u[1] for u in us], us[0][2]))
+            for (index, key, _), error in zip(group, errors):
+                batch_results[index] = batch_item_result(key_name, key, error, 'updated')
+        if any(result['status'] == 'updated' for result in batch_results.values()):
+            invalidation.record_change(cursor, table)
+        return batch_results
+
+    for index, result in run_batch(work).items():
+        results[index] = result
+    fragments.bump(table)
+    return jsonify({'results': results,
+                    'updated': sum(1 for r in results if r['status'] == 'updated'),
+                    'failed': sum(1 for r in results if r['status'] != 'updated')})
+
+def batch_delete(keys, key_name, fetch_existing, delete_many, table):
+    if keys is None:
+        return jsonify({'message': f'Expected a non-empty list of {key_name}s'}), 400
+    if len(keys) > app.config['ADMIN_BATCH_MAX_ITEMS']:
+        return jsonify({'message': f"At most {app.config['ADMIN_BATCH_MAX_ITEMS']} records per request"}), 413
+
+    def work(cursor):
+        existing = fetch_existing(cursor, keys)
+        present = [key for key in keys if key in existing]
+        errors = transactions.apply_batch(cursor, present, delete_many) if present else []
+        if any(error is None for error in errors):
+            invalidation.record_change(cursor, table)
+        failures = dict(zip(present, errors))
+        return [batch_item_result(key_name, key, failures[key], 'deleted') if key in existing
+                else batch_item_result(key_name, key, status='not_found') for key in keys]
+
+    results = run_batch(work)
+    fragments.bump(table)
+    return jsonify({'results': results,
+                    'deleted': sum(1 for r in results if r['status'] == 'deleted'),
+                    'failed': sum(1 for r in results if r['status'] != 'deleted')})
+
+def existing_srns(cursor, srns):
+    return {student.srn for student in repositories.students_by_srns(cursor, srns)}
+
+def existing_faculty_ids(cursor, faculty_ids):
+    return {faculty.faculty_id for faculty in repositories.faculty_by_ids(cursor, faculty_ids)}
+
+# Fetch several students for the update modal in one query
+@app.route('/get_student_data_batch', methods=['POST'])
+@login_required
+def get_student_data_batch():
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+
+    srns = batch_keys((request.get_json(silent=True) or {}).get('srns'), str)
+    if srns is None:
+        return jsonify({'message': 'Expected a non-empty list of srns'}), 400
+    if len(srns) > app.config['ADMIN_BATCH_MAX_ITEMS']:
+        return jsonify({'message': f"At most {app.config['ADMIN_BATCH_MAX_ITEMS']} records per request"}), 413
+
+    db = connect_db()
+    students = repositories.students_by_srns(db.cursor(), srns)
+    db.close()
+    found = {student.srn for student in students}
+    return jsonify({'students': [student_json(student) for student in students],
+                    'missing': [srn for srn in srns if srn not in found]})
+
+@app.route('/update_student_batch', methods=['POST'])
+@login_required
+def update_student_batch():
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+    return batch_update((request.get_json(silent=True) or {}).get('students'), 'srn', str,
+                        repositories.STUDENT_UPDATE_COLUMNS, repositories.STUDENT_NUMERIC_FIELDS,
+                        existing_srns, repositories.update_students, 'Student')
+
+@app.route('/delete_student_batch', methods=['POST'])
+@login_required
+def delete_student_batch():
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+    srns = batch_keys((request.get_json(silent=True) or {}).get('srns'), str)
+    return batch_delete(srns, 'srn', existing_srns, repositories.delete_students, 'Student')
+
+# Fetch several faculty members for the update modal in one query
+@app.route('/get_faculty_data_batch', methods=['POST'])
+@login_required
+def get_faculty_data_batch():
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+
+    faculty_ids = batch_keys((request.get_json(silent=True) or {}).get('faculty_ids'), int)
+    if faculty_ids is None:
+        return jsonify({'message': 'Expected a non-empty list of faculty_ids'}), 400
+    if len(faculty_ids) > app.config['ADMIN_BATCH_MAX_ITEMS']:
+        return jsonify({'message': f"At most {app.config['ADMIN_BATCH_MAX_ITEMS']} records per request"}), 413
+
+    db = connect_db()
+    faculties = repositories.faculty_by_ids(db.cursor(), faculty_ids)
+    db.close()
+    found = {faculty.faculty_id for faculty in faculties}
+    return jsonify({'faculty': [faculty_json(faculty) for faculty in faculties],
+                    'missing': [faculty_id for faculty_id in faculty_ids if faculty_id not in found]})
+
+@app.route('/update_faculty_batch', methods=['POST'])
+@login_required
+def update_faculty_batch():
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+    return batch_update((request.get_json(silent=True) or {}).get('faculty'), 'faculty_id', int,
+                        repositories.FACULTY_UPDATE_COLUMNS, repositories.FACULTY_NUMERIC_FIELDS,
+                        existing_faculty_ids, repositories.update_faculty, 'Faculty')
+
+@app.route('/delete_faculty_batch', methods=['POST'])
+@login_required
+def delete_faculty_batch():
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+    faculty_ids = batch_keys((request.get_json(silent=True) or {}).get('faculty_ids'), int)
+    return batch_delete(faculty_ids, 'faculty_id', existing_faculty_ids, repositories.delete_faculty, 'Faculty')
+
+
+# Queue a background job (calculate_grades, export_students, bulk_update_teams, delete_team)
+@app.route('/admin/jobs/<job_type>', methods=['POST'])
+@login_required
+def enqueue_job(job_type):
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+    if job_type not in jobs.HANDLERS:
+        return jsonify({'message': 'Unknown job type'}), 404
+
+    payload = request.get_json(silent=True) or {}
+    db = connect_db()
+    job_id = jobs.enqueue(db, job_type, payload, created_by=current_user.admin_id)
+    db.close()
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+# Poll a job's status and progress
+@app.route('/admin/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+
+    db = connect_db()
+    job = jobs.get_job(db, job_id)
+    db.close()
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/admin/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+
+    db = connect_db()
+    cancelled = jobs.cancel(db, job_id)
+    db.close()
+    if not cancelled:
+        return jsonify({'message': 'Job is not queued or running'}), 409
+    return jsonify({'message': 'Cancellation requested'})
+
+@app.route('/admin/jobs/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry_job(job_id):
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+
+    db = connect_db()
+    retried = jobs.retry(db, job_id)
+    db.close()
+    if not retried:
+        return jsonify({'message': 'Only failed or cancelled jobs can be retried'}), 409
+    return jsonify({'message': 'Job queued again'})
+
+# Download the file produced by an export job
+@app.route('/admin/jobs/<int:job_id>/download', methods=['GET'])
+@login_required
+def download_job_result(job_id):
+    if not is_admin():
+        flash('Access denied: Admins only', 'danger')
+        return redirect(url_for('admin_login'))
+
+    db = connect_db()
+    job = jobs.get_job(db, job_id)
+    db.close()
+    if not job or job['Status'] != 'succeeded' or not (job['Result'] or {}).get('path'):
+        flash('Export is not ready yet.', 'danger')
+        return redirect(url_for('admin_dashboard'))
+    return send_file(job['Result']['path'], as_attachment=True)
+
+# Slowest traced requests seen by this worker (see profiler.py)
+@app.route('/admin/traces', methods=['GET'])
+@login_required
+def admin_traces():
+    if not is_admin():
+        flash('Access denied: Admins only', 'danger')
+        return redirect(url_for('admin_login'))
+    return render_template('admin_traces.html', traces=slow_traces.list(), trace=None)
+
+@app.route('/admin/traces/<trace_id>', methods=['GET'])
+@login_required
+def admin_trace(trace_id):
+    if not is_admin():
+        flash('Access denied: Admins only', 'danger')
+        return redirect(url_for('admin_login'))
+    trace = slow_traces.get(trace_id)
+    if not trace:
+        flash('Trace not found, it may have been pushed out by slower ones.', 'danger')
+        return redirect(url_for('admin_traces'))
+    return render_template('admin_traces.html', traces=slow_traces.list(), trace=trace)
+
+# Folded stacks for flamegraph.pl or speedscope, kind is "spans" or "stacks"
+@app.route('/admin/traces/<trace_id>/<kind>.folded', methods=['GET'])
+@login_required
+def admin_trace_folded(trace_id, kind):
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+    trace = slow_traces.get(trace_id)
+    if not trace or kind not in ('spans', 'stacks'):
+        return jsonify({'message': 'Trace not found'}), 404
+    folded = trace.folded_spans() if kind == 'spans' else trace.folded_stacks()
+    return folded, 200, {'Content-Type': 'text/plain; charset=utf-8',
+                         'Content-Disposition': f'attachment; filename={trace_id}.{kind}.folded'}
+
+# Snapshot freshness and how often this worker could serve from it
+@app.route('/admin/snapshot', methods=['GET'])
+@login_required
+def snapshot_status():
+    if not is_admin():
+        return jsonify({'message': 'Access denied: Admins only'}), 403
+    return jsonify(dict(dashboard_snapshot.status(), enabled=app.config['SNAPSHOT_MODE']))
 
 # Logout
 @app.route('/logout', methods=['POST'])
@@ -916,5 +1367,10 @@ def logout():
 def is_admin():
     return current_user.is_authenticated and current_user.admin_id is not None
 
+# Load every template up front (from the bytecode cache when it is warm)
+if app.config['JINJA_PRELOAD_TEMPLATES']:
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,163 @@
+# Semester archival.
+#
+#   python archive.py 2025-EVEN              # move a finished term
+#   python archive.py 2025-EVEN --dry-run    # only count what would move
+#   python archive.py --status               # rows per term, hot and archived
+#
+# Moves the exams of a finished term, their Undergoes and CapstoneMarks rows,
+# and the StudentGrades of students with no marks left in the hot tables, into
+# the Archive_* tables (db_scripts/archive.sql). Rows move in small batches.
+# Each batch is its own short transaction that locks only the rows it copies
+# and deletes, and there is a pause between batches, so marks entry for the
+# current term is never blocked for long. Batches are retried on deadlock like
+# marks entry, and the script waits for replicas that fall too far behind.
+#
+# Archiving is idempotent: a run that is interrupted can simply be started
+# again.
+import argparse
+import time
+
+import db_router
+import invalidation
+import transactions
+from config import config_dict
+
+# Hot table -> (key columns, other columns), in the order they are archived.
+# Marks go before their exams because of the foreign keys.
+TABLES = {
+    'Undergoes': (('SRN', 'ExamID', 'FacultyID'), ('MarksObtained',)),
+    'CapstoneMarks': (('SRN', 'ExamID'), ('TotalMarks',)),
+    'StudentGrades': (('SRN', 'Semester'), ('Total_marks_in_sem', 'Grade')),
+    'Exam': (('ExamID',), ('ExamName', 'MaxMarksAllotted', 'exam_date', 'exam_time', 'TeamID')),
+}
+
+# Which rows of each table belong to the term being archived
+TERM_FILTERS = {
+    'Undergoes': "ExamID IN (SELECT ExamID FROM Exam WHERE Term = %s)",
+    'CapstoneMarks': "ExamID IN (SELECT ExamID FROM Exam WHERE Term = %s)",
+    # Grades are per semester, not per exam: they only move once the student
+    # has nothing left in the hot marks tables
+    'StudentGrades': ("SRN IN (SELECT SRN FROM Archive_CapstoneMarks WHERE Term = %s) "
+                      "AND SRN NOT IN (SELECT SRN FROM CapstoneMarks)"),
+    'Exam': "Term = %s",
+}
+
+
+def move_batch(cursor, table, term, batch_size):
+    keys, values = TABLES[table]
+    columns = keys + values
+    column_list = ', '.join(columns)
+
+    cursor.execute(f"SELECT {column_list} FROM {table} WHERE {TERM_FILTERS[table]} "
+                   f"ORDER BY {', '.join(keys)} LIMIT %s FOR UPDATE", (term, batch_size))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    placeholders = ', '.join(['%s'] * (len(columns) + 1))
+    updates = ', '.join(f"{column} = VALUES({column})" for column in values)
+    cursor.executemany(f"INSERT INTO Archive_{table} (Term, {column_list}) VALUES ({placeholders}) "
+                       f"ON DUPLICATE KEY UPDATE {updates}",
+                       [(term,) + tuple(row) for row in rows])
+
+    key_tuple = '(' + ', '.join(['%s'] * len(keys)) + ')'
+    cursor.execute(f"DELETE FROM {table} WHERE ({', '.join(keys)}) IN ({', '.join([key_tuple] * len(rows))})",
+                   [value for row in rows for value in row[:len(keys)]])
+    invalidation.record_change(cursor, table, f"Archive_{table}")
+    return len(rows)
+
+
+def wait_for_replicas(config, replicas):
+    # Deletes replicate too, don't let a big archive run push replicas out of rotation
+    max_lag = config.get('REPLICA_MAX_LAG_SECONDS', 5)
+    for replica, conn in replicas:
+        while True:
+            lag = db_router.replica_lag(config, replica, conn)
+            if lag is None or lag <= max_lag:
+                break
+            print(f"  replica {replica['host']} is {lag}s behind, waiting")
+            time.sleep(config.get('REPLICA_LAG_CHECK_INTERVAL', 2))
+
+
+def archive_term(config, term, batch_size, pause):
+    db = db_router.connect_primary(config)
+    replicas = []
+    for replica in config.get('DB_REPLICAS', []):
+        try:
+            replicas.append((replica, db_router.connect_replica_host(config, replica)))
+        except Exception as e:
+            print(f"Replica {replica['host']} unavailable, not throttling on it: {e}")
+
+    try:
+        for table in TABLES:
+            moved = 0
+            while True:
+                wait_for_replicas(config, replicas)
+                count, stats = transactions.run_in_transaction(
+                    db, lambda cursor: move_batch(cursor, table, term, batch_size),
+                    lock_wait_timeout=config['MARKS_LOCK_WAIT_TIMEOUT'],
+                    max_attempts=config['TRANSACTION_MAX_ATTEMPTS'],
+                    base_delay=config['TRANSACTION_RETRY_BASE_DELAY'],
+                    max_delay=config['TRANSACTION_RETRY_MAX_DELAY'])
+                moved += count
+                if stats.retries:
+                    print(f"  {table}: batch retried {stats.retries} times")
+                if count < batch_size:
+                    break
+                print(f"  {table}: {moved} rows so far")
+                time.sleep(pause)
+            print(f"{table}: archived {moved} rows")
+    finally:
+        db.close()
+        for _, conn in replicas:
+            conn.close()
+
+
+def count_term(config, term):
+    db = db_router.connect_primary(config)
+    cursor = db.cursor()
+    for table in TABLES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {TERM_FILTERS[table]}", (term,))
+        print(f"{table}: {cursor.fetchone()[0]} rows would be archived")
+    db.close()
+
+
+def print_status(config):
+    db = db_router.connect_primary(config)
+    cursor = db.cursor()
+    cursor.execute("SELECT Term, COUNT(*) FROM Exam GROUP BY Term ORDER BY Term")
+    for term, exams in cursor.fetchall():
+        print(f"hot      {term or '(untagged)':<12} {exams} exams")
+    cursor.execute("SELECT Term, COUNT(*) FROM Archive_Exam GROUP BY Term ORDER BY Term")
+    for term, exams in cursor.fetchall():
+        print(f"archived {term:<12} {exams} exams")
+    db.close()
+
+
+def main():
+    config = config_dict()
+    parser = argparse.ArgumentParser(description='Move a finished term into the archive tables')
+    parser.add_argument('term', nargs='?')
+    parser.add_argument('--batch-size', type=int, default=config['ARCHIVE_BATCH_SIZE'])
+    parser.add_argument('--pause', type=float, default=config['ARCHIVE_BATCH_PAUSE'],
+                        help='seconds to sleep between batches')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--status', action='store_true')
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(config)
+        return
+    if not args.term:
+        parser.error('a term is required')
+    if args.term == config['CURRENT_TERM']:
+        parser.error(f"{args.term} is the current term")
+
+    if args.dry_run:
+        count_term(config, args.term)
+    else:
+        archive_term(config, args.term, args.batch_size, args.pause)
+
+
+if __name__ == '__main__':
+    main()
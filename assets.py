@@ -0,0 +1,145 @@
+# Static asset pipeline.
+#
+# `python assets.py` copies every file under static/ into static/dist/ with a
+# content hash in its name (css/style.3f9a1c0b2d4e.css), writes gzip and, when
+# the brotli package is installed, brotli variants next to it, and records the
+# mapping in static/dist/manifest.json. Fingerprinted files are served from
+# /assets/ with far-future immutable cache headers; templates resolve them with
+# asset_url('css/style.css'), which falls back to the plain static URL until
+# the build has been run.
+#
+# init_app() also gzips HTML and JSON responses above COMPRESS_MIN_SIZE.
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Text formats worth precompressing, images are already compressed
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    manifest = {}
+
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir) and 'dist' in dirs:
+            dirs.remove('dist')
+        for name in files:
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            stem, ext = os.path.splitext(logical)
+            built = f"{stem}.{fingerprint(source)}{ext}"
+            target = os.path.join(dist_dir, built)
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            manifest[logical] = built
+
+            if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+                with open(source, 'rb') as f:
+                    data = f.read()
+                with open(target + '.gz', 'wb') as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(data, quality=11))
+
+    os.makedirs(dist_dir, exist_ok=True)
+    with open(os.path.join(dist_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def init_app(app):
+    manifest = load_manifest()
+
+    def asset_url(filename):
+        built = manifest.get(filename)
+        if built is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=built)
+
+    @app.context_processor
+    def inject_asset_url():
+        return {'asset_url': asset_url}
+
+    @app.route('/assets/<path:filename>')
+    def assets(filename):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if _accepts(candidate) and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+                encoding = candidate
+                filename += suffix
+                break
+
+        response = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Disposition', None)
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough
+                or response.status_code != 200
+                or response.mimetype not in app.config['COMPRESS_MIMETYPES']
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if not _accepts('gzip'):
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    return asset_url
+
+
+if __name__ == '__main__':
+    for logical, built in sorted(build().items()):
+        print(f"{logical} -> {built}")
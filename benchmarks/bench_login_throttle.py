@@ -0,0 +1,127 @@
+# Legitimate login latency under a brute-force storm, with and without throttling.
+#
+# A fixed pool of threads stands in for the server's workers. Attackers submit
+# wrong-password attempts at --attack-rate per second from --attack-ips
+# addresses. Legitimate users log in every --login-interval seconds between
+# them, each from their own address and at most at half of LOGIN_IP_RATE, so
+# the throttle has no reason to refuse them. Every accepted attempt pays a real
+# bcrypt.checkpw, exactly as the login routes do.
+#
+# The attack runs for --warmup seconds before logins are timed, long enough for
+# the attackers to spend their initial bursts, so the numbers show the steady
+# state. Both runs use the limits from Config.
+#
+#   python benchmarks/bench_login_throttle.py --seconds 10 --attack-rate 300
+import argparse
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from config import Config  # noqa: E402
+from throttle import LoginThrottle, MemoryBuckets  # noqa: E402
+
+
+def run(throttle, args, stored_hash):
+    # A fresh pool per run, drained at the end so no checkpw spills into the next one
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    counts = {'checkpw': 0, 'rejected': 0, 'legit_rejected': 0}
+    lock = threading.Lock()
+
+    def attempt(ip, account, password):
+        if throttle is not None and not throttle.allow(ip, account):
+            with lock:
+                counts['rejected'] += 1
+            return False
+        with lock:
+            counts['checkpw'] += 1
+        ok = bcrypt.checkpw(password, stored_hash)
+        if not ok and throttle is not None:
+            throttle.failed(account)
+        return ok
+
+    started = time.monotonic()
+    timed_from = started + args.warmup
+    stop = timed_from + args.seconds
+
+    def attacker():
+        n = 0
+        interval = 1.0 / args.attack_rate
+        next_at = time.monotonic()
+        while time.monotonic() < stop:
+            ip = '10.0.0.%d' % (n % args.attack_ips)
+            pool.submit(attempt, ip, 'student:victim%d@pes.edu' % (n % args.attack_accounts), b'wrong')
+            n += 1
+            next_at += interval
+            time.sleep(max(0, next_at - time.monotonic()))
+
+    attack_thread = threading.Thread(target=attacker, daemon=True)
+    attack_thread.start()
+
+    latencies = []
+    n = 0
+    next_at = time.monotonic()
+    while time.monotonic() < stop:
+        user = n % args.users
+        login_started = time.perf_counter()
+        ok = pool.submit(attempt, '192.168.1.%d' % user, 'student:user%d@pes.edu' % user, b'correct').result()
+        if time.monotonic() >= timed_from:
+            latencies.append((time.perf_counter() - login_started) * 1000)
+            if not ok:
+                counts['legit_rejected'] += 1
+        n += 1
+        next_at += args.login_interval
+        time.sleep(max(0, next_at - time.monotonic()))
+
+    attack_thread.join()
+    pool.shutdown(wait=True, cancel_futures=True)
+    return latencies, counts
+
+
+def report(name, latencies, counts):
+    if not latencies:
+        print(f"{name:<12} no logins finished in the timed window")
+        return
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<12} logins={len(latencies):<4} p50={statistics.median(latencies):8.1f}ms "
+          f"p99={p99:8.1f}ms max={latencies[-1]:8.1f}ms legit_rejected={counts['legit_rejected']} "
+          f"checkpw={counts['checkpw']} rejected={counts['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=10,
+                        help='seconds of attack before logins are timed')
+    parser.add_argument('--attack-rate', type=float, default=300)
+    parser.add_argument('--attack-ips', type=int, default=5)
+    parser.add_argument('--attack-accounts', type=int, default=5)
+    parser.add_argument('--login-interval', type=float, default=0.2)
+    parser.add_argument('--users', type=int,
+                        help='legitimate users, by default enough to keep each under half of LOGIN_IP_RATE')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--rounds', type=int, default=12)
+    args = parser.parse_args()
+    if args.users is None:
+        args.users = math.ceil(2 / (args.login_interval * Config.LOGIN_IP_RATE))
+
+    stored_hash = bcrypt.hashpw(b'correct', bcrypt.gensalt(rounds=args.rounds))
+
+    latencies, counts = run(None, args, stored_hash)
+    report('unthrottled', latencies, counts)
+
+    throttle = LoginThrottle(MemoryBuckets(Config.LOGIN_IP_RATE, Config.LOGIN_IP_BURST),
+                             MemoryBuckets(Config.LOGIN_ACCOUNT_RATE, Config.LOGIN_ACCOUNT_BURST))
+    latencies, counts = run(throttle, args, stored_hash)
+    report('throttled', latencies, counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# Concurrent marks entry: N evaluators per SRN submitting at the same time.
+#
+#   python benchmarks/bench_marks_contention.py --students 50 --evaluators 5
+#   python benchmarks/bench_marks_contention.py --isolation "REPEATABLE READ"
+#
+# Creates its own department, team, panel, faculty, students and exam, runs
+# every evaluator in its own thread and connection through the same
+# transactions.run_in_transaction() path as /marks_entry, then deletes what it
+# created. Reports throughput, retries and InnoDB row lock waits.
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import db_router  # noqa: E402
+import repositories  # noqa: E402
+import transactions  # noqa: E402
+from config import config_dict  # noqa: E402
+
+
+def global_status(cursor, name):
+    cursor.execute("SHOW GLOBAL STATUS LIKE %s", (name,))
+    return int(cursor.fetchone()[1])
+
+
+def create_fixtures(db, students, evaluators):
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO Department (DeptName) VALUES ('Bench')")
+    dept_id = cursor.lastrowid
+    cursor.execute("INSERT INTO Team (ProjectName, Domain, DeptID) VALUES ('Bench', 'Bench', %s)", (dept_id,))
+    team_id = cursor.lastrowid
+    cursor.execute("INSERT INTO Panel (PanelName, DeptID) VALUES ('Bench', %s)", (dept_id,))
+    panel_id = cursor.lastrowid
+
+    faculty_ids = []
+    for i in range(evaluators):
+        cursor.execute("INSERT INTO Faculty (FacultyName, Designation, PanelID) VALUES (%s, 'Bench', %s)",
+                       (f"Bench {i}", panel_id))
+        faculty_ids.append(cursor.lastrowid)
+
+    srns = [f"BN{i:06d}" for i in range(students)]
+    cursor.executemany("INSERT INTO Student (SRN, Name, Semester, DeptID, TeamID) VALUES (%s, 'Bench', 1, %s, %s)",
+                       [(srn, dept_id, team_id) for srn in srns])
+    cursor.execute("INSERT INTO Exam (ExamName, MaxMarksAllotted, TeamID) VALUES ('1 Bench', 100, %s)", (team_id,))
+    exam_id = cursor.lastrowid
+    db.commit()
+    return dept_id, team_id, panel_id, faculty_ids, srns, exam_id
+
+
+def drop_fixtures(db, dept_id, team_id, panel_id, faculty_ids, srns, exam_id):
+    cursor = db.cursor()
+    placeholders = ', '.join(['%s'] * len(srns))
+    cursor.execute(f"DELETE FROM Undergoes WHERE SRN IN ({placeholders})", srns)
+    cursor.execute(f"DELETE FROM StudentGrades WHERE SRN IN ({placeholders})", srns)
+    cursor.execute(f"DELETE FROM Student WHERE SRN IN ({placeholders})", srns)
+    cursor.execute("DELETE FROM Exam WHERE ExamID = %s", (exam_id,))
+    cursor.execute("DELETE FROM Faculty WHERE FacultyID IN (%s)" % ', '.join(['%s'] * len(faculty_ids)),
+                   faculty_ids)
+    cursor.execute("DELETE FROM Panel WHERE PanelID = %s", (panel_id,))
+    cursor.execute("DELETE FROM Team WHERE TeamID = %s", (team_id,))
+    cursor.execute("DELETE FROM Department WHERE DeptID = %s", (dept_id,))
+    db.commit()
+
+
+def evaluator(config, args, faculty_id, srns, exam_id, results, start):
+    db = db_router.connect_primary(config)
+    order = list(srns)
+    random.shuffle(order)
+    start.wait()
+    for srn in order:
+        try:
+            _, stats = transactions.run_in_transaction(
+                db, lambda cursor: repositories.insert_marks(cursor, srn, exam_id, faculty_id,
+                                                             random.randint(40, 100)),
+                isolation=args.isolation, lock_wait_timeout=args.lock_wait_timeout,
+                max_attempts=args.max_attempts)
+            results.append(stats)
+        except Exception as e:
+            results.append(e)
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--evaluators', type=int, default=5, help='concurrent evaluators per SRN')
+    parser.add_argument('--isolation', default=config_dict()['MARKS_ISOLATION_LEVEL'])
+    parser.add_argument('--lock-wait-timeout', type=int, default=config_dict()['MARKS_LOCK_WAIT_TIMEOUT'])
+    parser.add_argument('--max-attempts', type=int, default=config_dict()['TRANSACTION_MAX_ATTEMPTS'])
+    args = parser.parse_args()
+
+    config = config_dict()
+    db = db_router.connect_primary(config)
+    fixtures = create_fixtures(db, args.students, args.evaluators)
+    _, _, _, faculty_ids, srns, exam_id = fixtures
+    cursor = db.cursor()
+
+    try:
+        waits_before = global_status(cursor, 'Innodb_row_lock_waits')
+        wait_ms_before = global_status(cursor, 'Innodb_row_lock_time')
+
+        results = []
+        start = threading.Barrier(args.evaluators + 1)
+        threads = [threading.Thread(target=evaluator, args=(config, args, f, srns, exam_id, results, start))
+                   for f in faculty_ids]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        lock_waits = global_status(cursor, 'Innodb_row_lock_waits') - waits_before
+        lock_wait_ms = global_status(cursor, 'Innodb_row_lock_time') - wait_ms_before
+
+        done = [r for r in results if isinstance(r, transactions.TransactionStats)]
+        failed = [r for r in results if not isinstance(r, transactions.TransactionStats)]
+        print(f"isolation={args.isolation} students={args.students} evaluators/SRN={args.evaluators}")
+        print(f"committed={len(done)} failed={len(failed)} in {elapsed:.2f}s "
+              f"-> {len(done) / elapsed:.1f} marks/s")
+        print(f"retries={sum(s.retries for s in done)} deadlocks={sum(s.deadlocks for s in done)} "
+              f"lock_timeouts={sum(s.lock_timeouts for s in done)} "
+              f"time lost to retries={sum(s.failed_time + s.backoff_time for s in done):.2f}s")
+        print(f"innodb row lock waits={lock_waits} total lock wait={lock_wait_ms}ms")
+        for error in failed[:5]:
+            print(f"  failed: {error}")
+    finally:
+        drop_fixtures(db, *fixtures)
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Bytes on the wire and memory per row: SELECT * versus the repository projections.
+#
+#   python benchmarks/bench_projection.py              # against Config's database
+#   python benchmarks/bench_projection.py --synthetic 10000   # allocation only, no database
+#
+# Bytes are the server's Bytes_sent session counter around each query. Memory
+# is what tracemalloc sees retained by the fetched rows.
+import argparse
+import os
+import sys
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import repositories  # noqa: E402
+
+CASES = [
+    ('students', "SELECT * FROM Student", repositories.STUDENTS_SQL, repositories.StudentRow),
+    ('faculty', "SELECT * FROM Faculty", repositories.FACULTY_SQL, repositories.FacultyRow),
+]
+
+
+def bytes_sent(cursor):
+    cursor.execute("SHOW SESSION STATUS LIKE 'Bytes_sent'")
+    return int(cursor.fetchone()[1])
+
+
+def measure_bytes(cursor, sql):
+    # Subtract what the status query itself costs
+    before = bytes_sent(cursor)
+    overhead = bytes_sent(cursor) - before
+    before = bytes_sent(cursor)
+    cursor.execute(sql)
+    rows = cursor.fetchall()
+    return bytes_sent(cursor) - before - overhead, rows
+
+
+def retained_bytes(build):
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    rows = build()
+    used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(start, 'filename'))
+    tracemalloc.stop()
+    return used, len(rows)
+
+
+def report(name, label, total, count):
+    print(f"{name:<10} {label:<22} {total:>12,} bytes  {total / max(count, 1):8.1f} per row")
+
+
+def run_database():
+    import db_router
+    from config import config_dict
+
+    db = db_router.connect_primary(config_dict())
+    cursor = db.cursor()
+    for name, star_sql, projected_sql, row_type in CASES:
+        star_bytes, star_rows = measure_bytes(cursor, star_sql)
+        projected_bytes, projected_rows = measure_bytes(cursor, projected_sql)
+        report(name, 'wire SELECT *', star_bytes, len(star_rows))
+        report(name, 'wire projection', projected_bytes, len(projected_rows))
+
+        # Re-fetch inside the measurement so only the rows themselves are counted
+        def fetch(sql, make=None):
+            cursor.execute(sql)
+            rows = cursor.fetchall()
+            return list(map(make, rows)) if make else rows
+        report(name, 'memory SELECT *', *retained_bytes(lambda: fetch(star_sql)))
+        report(name, 'memory namedtuple', *retained_bytes(lambda: fetch(projected_sql, row_type._make)))
+    db.close()
+
+
+def run_synthetic(count):
+    def star_row(i):
+        return (f"PES{i:07d}", f"Student {i}", f"student{i}@pes.edu", "9876543210", 'M', 'A', 6,
+                Decimal('8.75'), 1, i % 500, i % 80, f"$2b$12${i:053d}")
+
+    def projected_row(i):
+        return repositories.StudentRow._make(star_row(i)[:11])
+
+    def dict_row(i):
+        return dict(zip(repositories.StudentRow._fields + ('password',), star_row(i)))
+
+    report('students', 'memory SELECT * tuple', *retained_bytes(lambda: [star_row(i) for i in range(count)]))
+    report('students', 'memory dict rows', *retained_bytes(lambda: [dict_row(i) for i in range(count)]))
+    report('students', 'memory namedtuple', *retained_bytes(lambda: [projected_row(i) for i in range(count)]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--synthetic', type=int, metavar='ROWS',
+                        help='measure allocation on generated rows instead of the database')
+    args = parser.parse_args()
+    if args.synthetic:
+        run_synthetic(args.synthetic)
+    else:
+        run_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Dashboard requests per second: live MySQL versus the SQLite snapshot.
+#
+#   python benchmarks/bench_snapshot.py --threads 8 --seconds 10
+#   python benchmarks/bench_snapshot.py --srn PES1202100123 --faculty-id 4
+#
+# Refreshes the snapshot once, then drives /student_dashboard and
+# /faculty_dashboard through Flask's test client from several threads, first
+# with SNAPSHOT_MODE off and then on. Reports throughput and latency
+# percentiles for each path.
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import db_router  # noqa: E402
+import snapshot  # noqa: E402
+from app import app, dashboard_snapshot  # noqa: E402
+
+
+def pick_users(config, args):
+    db = db_router.connect_primary(config)
+    cursor = db.cursor()
+    srn, faculty_id = args.srn, args.faculty_id
+    if srn is None:
+        cursor.execute("SELECT SRN FROM Student WHERE TeamID IS NOT NULL LIMIT 1")
+        srn = cursor.fetchone()[0]
+    if faculty_id is None:
+        cursor.execute("SELECT FacultyID FROM Student WHERE FacultyID IS NOT NULL LIMIT 1")
+        faculty_id = cursor.fetchone()[0]
+    db.close()
+    return srn, faculty_id
+
+
+def client_loop(srn, faculty_id, deadline, latencies, errors):
+    student = app.test_client()
+    with student.session_transaction() as session:
+        session['_user_id'] = srn
+    faculty = app.test_client()
+    with faculty.session_transaction() as session:
+        session['_user_id'] = str(faculty_id)
+    urls = [(student, f"/student_dashboard/{srn}"), (faculty, f"/faculty_dashboard/{faculty_id}")]
+
+    i = 0
+    while time.perf_counter() < deadline:
+        client, url = urls[i % len(urls)]
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+        i += 1
+
+
+def run(label, threads, seconds, srn, faculty_id, report=True):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    workers = [threading.Thread(target=client_loop, args=(srn, faculty_id, deadline, latencies, errors))
+               for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    if not report:
+        return
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<10} {len(latencies) / elapsed:8.1f} req/s  p50 {p50:7.2f}ms  p95 {p95:7.2f}ms  "
+          f"errors={len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--srn')
+    parser.add_argument('--faculty-id', type=int)
+    args = parser.parse_args()
+
+    config = dict(app.config)
+    srn, faculty_id = pick_users(config, args)
+    snapshot.refresh(config, db_router.connect_primary(config))
+
+    # No exporter runs during the benchmark, don't let the snapshot age out
+    dashboard_snapshot.max_staleness = 10 ** 9
+    for label, mode in (('mysql', False), ('snapshot', True)):
+        app.config['SNAPSHOT_MODE'] = mode
+        run(label, 1, 1, srn, faculty_id, report=False)  # Warm up templates and caches
+        run(label, args.threads, args.seconds, srn, faculty_id)
+    print(f"snapshot served={dashboard_snapshot.served} fallbacks={dashboard_snapshot.fallbacks}")
+
+
+if __name__ == '__main__':
+    main()
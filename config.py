@@ -1,6 +1,91 @@
 class Config:
     SECRET_KEY = 'chai_idhu'
     DB_HOST = 'localhost'
+    DB_PORT = 3306
     DB_USER = 'root'
     DB_PASSWORD = 'Vidhu@1174'
     DB_NAME = 'capstone_management'
+
+    # Read replicas for the read-only routes, e.g. [{'host': '127.0.0.1', 'port': 3307}]
+    DB_REPLICAS = []
+    REPLICA_MAX_LAG_SECONDS = 5
+    REPLICA_LAG_CHECK_INTERVAL = 2
+    GTID_WAIT_TIMEOUT = 0.5
+
+    # Login throttling: tokens per second and bucket size
+    LOGIN_IP_RATE = 1
+    LOGIN_IP_BURST = 20
+    LOGIN_ACCOUNT_RATE = 0.1
+    LOGIN_ACCOUNT_BURST = 5
+    # 'memory' keeps buckets per worker, 'sqlite' shares them between workers
+    LOGIN_THROTTLE_BACKEND = 'memory'
+    LOGIN_THROTTLE_DB_PATH = '/tmp/capstone_login_throttle.db'
+
+    # Gzip HTML/JSON responses larger than this many bytes
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+
+    # Rendered-fragment LRU size and on-disk Jinja bytecode cache
+    FRAGMENT_CACHE_SIZE = 128
+    JINJA_BYTECODE_CACHE_DIR = '/tmp/capstone_jinja_cache'
+    JINJA_PRELOAD_TEMPLATES = True
+
+    # Background jobs (python jobs.py)
+    JOB_WORKERS = 4
+    JOB_CONCURRENCY = {'calculate_grades': 1, 'export_students': 2, 'bulk_update_teams': 1, 'delete_team': 2}
+    JOB_DEFAULT_CONCURRENCY = 1
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_BACKOFF = 10
+    JOB_POLL_INTERVAL = 1
+    JOB_HEARTBEAT_TIMEOUT = 120
+    JOB_DELETE_BATCH_SIZE = 500
+    JOB_EXPORT_DIR = '/tmp/capstone_exports'
+
+    # Cross-worker cache invalidation (python invalidation.py)
+    INVALIDATION_SOCKET_DIR = '/tmp/capstone_invalidation'
+    INVALIDATION_POLL_INTERVAL = 0.2
+    INVALIDATION_BATCH_SIZE = 500
+    INVALIDATION_HEARTBEAT_INTERVAL = 1
+    INVALIDATION_MAX_SILENCE = 5
+    OUTBOX_GAP_TIMEOUT = 2
+    OUTBOX_RETENTION_SECONDS = 3600
+
+    # Marks entry transactions: isolation, lock wait and deadlock retry
+    MARKS_ISOLATION_LEVEL = 'READ COMMITTED'
+    MARKS_LOCK_WAIT_TIMEOUT = 5
+    TRANSACTION_MAX_ATTEMPTS = 5
+    TRANSACTION_RETRY_BASE_DELAY = 0.02
+    TRANSACTION_RETRY_MAX_DELAY = 0.5
+
+    # Semester archival: exams are tagged with CURRENT_TERM, archive.py moves
+    # finished terms out of the hot tables in batches
+    CURRENT_TERM = '2026-ODD'
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVE_BATCH_PAUSE = 0.2
+
+    # Request tracing: admins trace a request with "X-Profile: 1" (or "stack"
+    # to also sample Python stacks), PROFILE_SAMPLE_RATE traces random requests
+    PROFILE_SAMPLE_RATE = 0.0
+    PROFILE_SAMPLE_STACKS = False
+    PROFILE_STACK_INTERVAL = 0.005
+    PROFILE_KEEP_SLOWEST = 20
+    PROFILE_DIR = '/tmp/capstone_traces'
+    PROFILE_KEEP_FILES = 500
+
+    # Most records one admin batch request (get, update or delete) may name
+    ADMIN_BATCH_MAX_ITEMS = 500
+    # Each password change costs a bcrypt hash, cap them separately
+    ADMIN_BATCH_MAX_PASSWORDS = 20
+
+    # Result-day snapshot: dashboards read a local SQLite copy (see snapshot.py)
+    # and fall back to MySQL when it is older than SNAPSHOT_MAX_STALENESS
+    SNAPSHOT_MODE = False
+    SNAPSHOT_PATH = '/tmp/capstone_snapshot/dashboards.sqlite3'
+    SNAPSHOT_REFRESH_INTERVAL = 10
+    SNAPSHOT_MAX_STALENESS = 120
+
+
+def config_dict():
+    # Config as a plain dict, for the command line tools that run without Flask
+    return {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
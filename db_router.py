@@ -0,0 +1,161 @@
+# Read/write splitting for the Capstone portal.
+#
+# Read-only routes are served from one of the replicas in Config.DB_REPLICAS,
+# everything else goes to the primary (Config.DB_HOST). A replica is skipped
+# when it lags more than REPLICA_MAX_LAG_SECONDS behind its source, and a
+# session that has just written waits on the replica for its own GTID set so
+# a user always reads their own writes.
+import random
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+from MySQLdb.connections import Connection
+from flask import request, session, has_request_context
+
+# Endpoints that never write and can be served from a replica
+READ_ONLY_ENDPOINTS = {
+    'student_dashboard',
+    'faculty_dashboard',
+    'student_details',
+    'faculty_details',
+    'search_marks',
+}
+
+# Endpoints that are only read-only for GET requests
+READ_ONLY_GET_ENDPOINTS = {
+    'manage_panels',
+}
+
+# Cached replica health: (host, port) -> (checked_at, lag_seconds or None)
+_replica_lag = {}
+
+
+class PrimaryConnection(Connection):
+    # Remember what this session wrote so replica reads can wait for it
+    def commit(self):
+        super().commit()
+        if not has_request_context():
+            return
+        cursor = self.cursor()
+        try:
+            cursor.execute("SELECT @@GLOBAL.gtid_executed")
+            gtid_set = cursor.fetchone()[0]
+        except MySQLdb.Error:
+            gtid_set = ''
+        finally:
+            cursor.close()
+        session['last_write_gtid'] = gtid_set or ''
+        session['last_write_at'] = time.time()
+
+
+def is_read_only_request():
+    if not has_request_context():
+        return False
+    if request.endpoint in READ_ONLY_ENDPOINTS:
+        return True
+    return request.endpoint in READ_ONLY_GET_ENDPOINTS and request.method == 'GET'
+
+
+def connect_primary(config):
+    return PrimaryConnection(
+        host=config['DB_HOST'],
+        port=config.get('DB_PORT', 3306),
+        user=config['DB_USER'],
+        passwd=config['DB_PASSWORD'],
+        db=config['DB_NAME']
+    )
+
+
+def is_primary(conn):
+    # connect_replica() falls back to the primary when no replica is usable
+    return isinstance(conn, PrimaryConnection)
+
+
+def connect_replica_host(config, replica):
+    return MySQLdb.connect(
+        host=replica['host'],
+        port=replica.get('port', 3306),
+        user=replica.get('user', config['DB_USER']),
+        passwd=replica.get('password', config['DB_PASSWORD']),
+        db=config['DB_NAME'],
+        connect_timeout=replica.get('connect_timeout', 2)
+    )
+
+
+def _measure_lag(conn):
+    # SHOW REPLICA STATUS exists from 8.0.22, older servers only know SLAVE
+    cursor = conn.cursor(MySQLdb.cursors.DictCursor)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except MySQLdb.Error:
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+    finally:
+        cursor.close()
+
+    if not status:
+        return None  # Not configured as a replica
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else int(lag)  # None means replication is stopped
+
+
+def replica_lag(config, replica, conn):
+    key = (replica['host'], replica.get('port', 3306))
+    checked_at, lag = _replica_lag.get(key, (0, None))
+    if time.time() - checked_at >= config.get('REPLICA_LAG_CHECK_INTERVAL', 2):
+        lag = _measure_lag(conn)
+        _replica_lag[key] = (time.time(), lag)
+    return lag
+
+
+def _wait_for_own_writes(config, conn):
+    last_write_at = session.get('last_write_at')
+    if last_write_at is None:
+        return True
+    if time.time() - last_write_at > config.get('REPLICA_MAX_LAG_SECONDS', 5):
+        # Replicas further behind than that are out of rotation, so every
+        # replica we could pick has these writes
+        session.pop('last_write_gtid', None)
+        session.pop('last_write_at', None)
+        return True
+
+    gtid_set = session.get('last_write_gtid')
+    if not gtid_set:
+        # Without GTIDs, stay on the primary until any replica lag has passed
+        return False
+
+    # Checked on every read until the lag window is over, the next read may
+    # land on a different replica that is further behind
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT WAIT_FOR_EXECUTED_GTID_SET(%s, %s)",
+                       (gtid_set, config.get('GTID_WAIT_TIMEOUT', 0.5)))
+        timed_out = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    return not timed_out
+
+
+def connect_replica(config):
+    replicas = list(config.get('DB_REPLICAS') or [])
+    random.shuffle(replicas)
+    max_lag = config.get('REPLICA_MAX_LAG_SECONDS', 5)
+
+    for replica in replicas:
+        try:
+            conn = connect_replica_host(config, replica)
+        except MySQLdb.OperationalError:
+            continue
+
+        try:
+            lag = replica_lag(config, replica, conn)
+            if lag is not None and lag <= max_lag and _wait_for_own_writes(config, conn):
+                return conn
+        except MySQLdb.Error:
+            pass
+        conn.close()
+
+    # No usable replica, fall back to the primary
+    return connect_primary(config)
@@ -0,0 +1,50 @@
+use capstone_management;
+
+-- Semester archival, see archive.py.
+--
+-- Every exam belongs to an academic term. When a term is archived its exams,
+-- marks and the grades of students who have nothing left in the hot tables
+-- move to the Archive_* tables below, so the hot tables only hold the current
+-- cohort. The hot tables can't be partitioned because InnoDB does not support
+-- partitioning tables that have foreign keys. The archive tables have no
+-- foreign keys and are partitioned by term.
+
+ALTER TABLE Exam ADD COLUMN Term VARCHAR(10) NOT NULL DEFAULT '';
+CREATE INDEX idx_exam_term ON Exam (Term);
+
+CREATE TABLE Archive_Exam (
+    Term VARCHAR(10) NOT NULL,
+    ExamID INT NOT NULL,
+    ExamName VARCHAR(50),
+    MaxMarksAllotted INT,
+    exam_date DATE,
+    exam_time TIME,
+    TeamID INT,
+    PRIMARY KEY (Term, ExamID)
+) PARTITION BY KEY (Term) PARTITIONS 16;
+
+CREATE TABLE Archive_Undergoes (
+    Term VARCHAR(10) NOT NULL,
+    SRN VARCHAR(10) NOT NULL,
+    ExamID INT NOT NULL,
+    FacultyID INT NOT NULL,
+    MarksObtained INT,
+    PRIMARY KEY (Term, SRN, ExamID, FacultyID)
+) PARTITION BY KEY (Term) PARTITIONS 16;
+
+CREATE TABLE Archive_CapstoneMarks (
+    Term VARCHAR(10) NOT NULL,
+    SRN VARCHAR(10) NOT NULL,
+    ExamID INT NOT NULL,
+    TotalMarks INT,
+    PRIMARY KEY (Term, SRN, ExamID)
+) PARTITION BY KEY (Term) PARTITIONS 16;
+
+CREATE TABLE Archive_StudentGrades (
+    Term VARCHAR(10) NOT NULL,
+    SRN VARCHAR(10) NOT NULL,
+    Semester INT NOT NULL,
+    Total_marks_in_sem INT,
+    Grade ENUM('S', 'A', 'B', 'C', 'D', 'E', 'F'),
+    PRIMARY KEY (Term, SRN, Semester)
+) PARTITION BY KEY (Term) PARTITIONS 16;
@@ -0,0 +1,23 @@
+use capstone_management;
+
+-- Background jobs, see jobs.py
+CREATE TABLE Job (
+    JobID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    JobType VARCHAR(50) NOT NULL,
+    Payload JSON,
+    Status ENUM('queued', 'running', 'succeeded', 'failed', 'cancelled') NOT NULL DEFAULT 'queued',
+    CancelRequested BOOLEAN NOT NULL DEFAULT FALSE,
+    Progress INT NOT NULL DEFAULT 0,
+    Message VARCHAR(255),
+    Result JSON,
+    Attempts INT NOT NULL DEFAULT 0,
+    MaxAttempts INT NOT NULL DEFAULT 3,
+    RunAfter DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CreatedBy INT,
+    CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    StartedAt DATETIME,
+    HeartbeatAt DATETIME,
+    FinishedAt DATETIME,
+    INDEX idx_job_queue (Status, RunAfter),
+    FOREIGN KEY (CreatedBy) REFERENCES admin(AdminID) ON DELETE SET NULL
+);
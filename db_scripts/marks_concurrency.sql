@@ -0,0 +1,104 @@
+use capstone_management;
+
+-- Concurrent marks entry.
+--
+-- Several panel members insert into Undergoes for the same student at once.
+-- The old triggers averaged marks from the transaction's snapshot, so two
+-- concurrent evaluators could each miss the other's row and leave a stale
+-- CapstoneMarks total. They also recalculated grades for every student,
+-- locking the whole table. The triggers below lock the student's
+-- CapstoneMarks row first, which serializes evaluators of the same
+-- student/exam, then average the latest committed marks (run marks entry under
+-- READ COMMITTED) and only recalculate that student's grade.
+--
+-- The 9-entry count spans all of a student's exams, so inserts for the same
+-- student on different exams are serialized too: a BEFORE trigger locks the
+-- Student row. It runs before the foreign key check takes its shared lock on
+-- that row, so evaluators wait for each other instead of deadlocking, and the
+-- second one counts the first one's committed entry.
+
+DROP TRIGGER IF EXISTS calculate_total_marks;
+DROP TRIGGER IF EXISTS check_undergoes_count;
+DROP TRIGGER IF EXISTS lock_student_for_marks;
+DROP PROCEDURE IF EXISTS calculate_grades_for_student;
+
+DELIMITER //
+
+CREATE PROCEDURE calculate_grades_for_student(IN p_srn VARCHAR(10))
+BEGIN
+    INSERT INTO StudentGrades (SRN, Semester, Total_marks_in_sem, Grade)
+    SELECT
+        s.SRN,
+        s.Semester,
+        SUM(c.TotalMarks) AS Total_marks_in_sem,
+        CASE
+            WHEN SUM(c.TotalMarks) >= 90 THEN 'S'
+            WHEN SUM(c.TotalMarks) >= 80 THEN 'A'
+            WHEN SUM(c.TotalMarks) >= 70 THEN 'B'
+            WHEN SUM(c.TotalMarks) >= 60 THEN 'C'
+            WHEN SUM(c.TotalMarks) >= 50 THEN 'D'
+            WHEN SUM(c.TotalMarks) >= 40 THEN 'E'
+            ELSE 'F'
+        END AS Grade
+    FROM
+        Student s
+    JOIN
+        CapstoneMarks c ON s.SRN = c.SRN
+    JOIN
+        Exam e ON c.ExamID = e.ExamID
+    WHERE
+        s.SRN = p_srn
+        AND LEFT(e.ExamName, 1) = CAST(s.Semester AS CHAR)
+    GROUP BY
+        s.SRN, s.Semester
+    ON DUPLICATE KEY UPDATE
+        Total_marks_in_sem = VALUES(Total_marks_in_sem),
+        Grade = VALUES(Grade);
+END //
+
+CREATE TRIGGER lock_student_for_marks
+BEFORE INSERT ON Undergoes
+FOR EACH ROW
+BEGIN
+    DECLARE locked INT;
+
+    SELECT 1 INTO locked FROM Student WHERE SRN = NEW.SRN FOR UPDATE;
+END //
+
+CREATE TRIGGER calculate_total_marks
+AFTER INSERT ON Undergoes
+FOR EACH ROW
+BEGIN
+    DECLARE avg_marks INT;
+
+    -- Take the row lock before reading, so the average includes every committed evaluator
+    INSERT INTO CapstoneMarks (SRN, ExamID, TotalMarks)
+    VALUES (NEW.SRN, NEW.ExamID, NEW.MarksObtained)
+    ON DUPLICATE KEY UPDATE TotalMarks = TotalMarks;
+
+    SELECT AVG(MarksObtained) INTO avg_marks
+    FROM Undergoes
+    WHERE SRN = NEW.SRN AND ExamID = NEW.ExamID;
+
+    UPDATE CapstoneMarks SET TotalMarks = avg_marks
+    WHERE SRN = NEW.SRN AND ExamID = NEW.ExamID;
+END //
+
+CREATE TRIGGER check_undergoes_count
+AFTER INSERT ON Undergoes
+FOR EACH ROW
+FOLLOWS calculate_total_marks
+BEGIN
+    DECLARE entry_count INT;
+
+    SELECT COUNT(*) INTO entry_count
+    FROM Undergoes
+    WHERE SRN = NEW.SRN;
+
+    -- Every 9 entries completes a student's semester, grade just that student
+    IF entry_count % 9 = 0 THEN
+        CALL calculate_grades_for_student(NEW.SRN);
+    END IF;
+END //
+
+DELIMITER ;
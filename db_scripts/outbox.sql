@@ -0,0 +1,9 @@
+use capstone_management;
+
+-- Tables changed by each write, tailed by invalidation.py
+CREATE TABLE ChangeOutbox (
+    EventID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    TableName VARCHAR(50) NOT NULL,
+    CreatedAt DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    INDEX idx_outbox_created (CreatedAt)
+);
@@ -0,0 +1,25 @@
+-- Local replica pair for testing read/write splitting.
+--
+-- Start two mysqld instances on the same box, both with:
+--   gtid_mode=ON
+--   enforce_gtid_consistency=ON
+-- and distinct server_id values, the primary on port 3306 and the replica
+-- on port 3307. Load init_db.sql on the primary only.
+
+-- On the primary (port 3306)
+CREATE USER IF NOT EXISTS 'repl'@'127.0.0.1' IDENTIFIED BY 'repl_password';
+GRANT REPLICATION SLAVE ON *.* TO 'repl'@'127.0.0.1';
+
+-- On the replica (port 3307)
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = '127.0.0.1',
+    SOURCE_PORT = 3306,
+    SOURCE_USER = 'repl',
+    SOURCE_PASSWORD = 'repl_password',
+    SOURCE_AUTO_POSITION = 1,
+    GET_SOURCE_PUBLIC_KEY = 1;
+START REPLICA;
+SET GLOBAL super_read_only = ON;
+
+-- The app user needs REPLICATION CLIENT on the replica to read its lag:
+-- GRANT REPLICATION CLIENT ON *.* TO 'root'@'localhost';
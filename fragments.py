@@ -0,0 +1,69 @@
+# Rendered-fragment cache.
+#
+# Large table fragments (panels, teams, students) are cached as rendered HTML
+# keyed on the data version of every table they read. Write routes call
+# bump() for the tables they touched, which makes old entries unreachable;
+# they are then pushed out by LRU eviction.
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+# Table -> data version, bumped by every write that touches the table
+_versions = {}
+_versions_lock = threading.Lock()
+# Bumped when every fragment must be considered stale
+_epoch = 0
+
+
+def bump(*tables):
+    with _versions_lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+def bump_all():
+    global _epoch
+    with _versions_lock:
+        _epoch += 1
+
+
+def versions(tables):
+    return (_epoch,) + tuple(_versions.get(table, 0) for table in tables)
+
+
+class FragmentCache:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, name, tables, render, *key_parts, store=True):
+        # store=False for renders from a replica: the replica may not have the
+        # writes behind the current versions yet, so the HTML would be stale
+        # under a key that looks fresh
+        key = (name, key_parts, versions(tables))
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        # Render outside the lock, a concurrent miss just renders twice
+        html = Markup(render())
+        if not store:
+            return html
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
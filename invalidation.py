@@ -0,0 +1,182 @@
+# Cross-worker cache invalidation.
+#
+# Every write records the tables it changed in the ChangeOutbox table
+# (db_scripts/outbox.sql) inside the same transaction. A single dispatcher
+#
+#   python invalidation.py
+#
+# tails the outbox and broadcasts batches of changed tables to every web worker
+# over Unix datagram sockets in INVALIDATION_SOCKET_DIR. Workers bump the data
+# versions in fragments.py, which invalidates their cached fragments.
+#
+# Delivery is at least once: the dispatcher only advances its saved position
+# after a batch went out, and a replayed batch just bumps versions again.
+# Every message carries the last outbox ID, so a worker that notices a gap, or
+# hears nothing (not even a heartbeat) for INVALIDATION_MAX_SILENCE seconds,
+# drops its whole cache. Caches therefore never lag writes by more than that.
+import atexit
+import glob
+import json
+import os
+import socket
+import threading
+import time
+
+import fragments
+from config import config_dict
+
+
+def record_change(cursor, *tables):
+    # Call before commit, so the event commits or rolls back with the write
+    cursor.executemany("INSERT INTO ChangeOutbox (TableName) VALUES (%s)", [(t,) for t in tables])
+
+
+# --- Web worker side ---------------------------------------------------------
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listener(config):
+    # Started lazily so every forked worker gets its own socket and thread
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        socket_dir = config['INVALIDATION_SOCKET_DIR']
+        os.makedirs(socket_dir, exist_ok=True)
+        path = os.path.join(socket_dir, f"worker-{os.getpid()}.sock")
+        if os.path.exists(path):
+            os.unlink(path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.settimeout(config['INVALIDATION_MAX_SILENCE'])
+        atexit.register(_remove_socket, path)
+
+        thread = threading.Thread(target=_listen, args=(sock,), name='invalidation-listener', daemon=True)
+        thread.start()
+        _listener_pid = os.getpid()
+
+
+def _remove_socket(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _listen(sock):
+    last_seen = None
+    while True:
+        try:
+            message = json.loads(sock.recv(65536))
+        except socket.timeout:
+            # Dispatcher is silent, anything cached may be stale
+            fragments.bump_all()
+            last_seen = None
+            continue
+        except ValueError:
+            continue
+
+        first, last = message['first'], message['last']
+        missed = last_seen is not None and (
+            (first is not None and first > last_seen + 1) or (first is None and last > last_seen))
+        if missed or message.get('replay'):
+            fragments.bump_all()
+        if message['tables']:
+            fragments.bump(*message['tables'])
+        last_seen = last if last_seen is None else max(last_seen, last)
+
+
+# --- Dispatcher --------------------------------------------------------------
+
+def load_position(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_position(path, event_id):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(str(event_id))
+    os.replace(tmp, path)
+
+
+def broadcast(sock, socket_dir, message):
+    data = json.dumps(message).encode()
+    for path in glob.glob(os.path.join(socket_dir, 'worker-*.sock')):
+        try:
+            sock.sendto(data, path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            _remove_socket(path)  # The worker is gone
+        except BlockingIOError:
+            pass  # Its buffer is full, it will see the gap on the next message
+
+
+def dispatch_forever(config):
+    import db_router  # Only the dispatcher process needs MySQLdb
+
+    socket_dir = config['INVALIDATION_SOCKET_DIR']
+    os.makedirs(socket_dir, exist_ok=True)
+    state_path = os.path.join(socket_dir, 'dispatcher.position')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+
+    db = db_router.connect_primary(config)
+    db.autocommit(True)
+    cursor = db.cursor()
+
+    position = load_position(state_path)
+    if position is None:
+        # First start: nothing to replay, but workers can't trust what they cached
+        cursor.execute("SELECT COALESCE(MAX(EventID), 0) FROM ChangeOutbox")
+        position = cursor.fetchone()[0]
+        broadcast(sock, socket_dir, {'first': None, 'last': position, 'tables': [], 'replay': True})
+        save_position(state_path, position)
+
+    last_heartbeat = last_prune = time.monotonic()
+    while True:
+        cursor.execute("SELECT EventID, TableName, CreatedAt < NOW(3) - INTERVAL %s SECOND "
+                       "FROM ChangeOutbox WHERE EventID > %s ORDER BY EventID LIMIT %s",
+                       (config['OUTBOX_GAP_TIMEOUT'], position, config['INVALIDATION_BATCH_SIZE']))
+        rows = cursor.fetchall()
+
+        # IDs are allocated before commit, so a gap may still be filled by a
+        # slower transaction. Wait for it unless it is old enough to be a rollback.
+        events = []
+        expected = position + 1
+        for event_id, table, settled in rows:
+            if event_id != expected and not settled:
+                break
+            events.append((event_id, table))
+            expected = event_id + 1
+
+        if events:
+            tables = sorted({table for _, table in events})
+            broadcast(sock, socket_dir, {'first': position + 1, 'last': events[-1][0], 'tables': tables})
+            position = events[-1][0]
+            save_position(state_path, position)
+            last_heartbeat = time.monotonic()
+        elif time.monotonic() - last_heartbeat >= config['INVALIDATION_HEARTBEAT_INTERVAL']:
+            broadcast(sock, socket_dir, {'first': None, 'last': position, 'tables': []})
+            last_heartbeat = time.monotonic()
+
+        if time.monotonic() - last_prune >= 60:
+            # Delivered events are only kept around for inspection
+            cursor.execute("DELETE FROM ChangeOutbox WHERE EventID <= %s "
+                           "AND CreatedAt < NOW() - INTERVAL %s SECOND LIMIT 10000",
+                           (position, config['OUTBOX_RETENTION_SECONDS']))
+            last_prune = time.monotonic()
+
+        if len(rows) < config['INVALIDATION_BATCH_SIZE'] or len(events) < len(rows):
+            time.sleep(config['INVALIDATION_POLL_INTERVAL'])
+
+
+if __name__ == '__main__':
+    dispatch_forever(config_dict())
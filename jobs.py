@@ -0,0 +1,384 @@
+# Background jobs for heavy admin operations.
+#
+# Admin routes enqueue a row in the Job table (db_scripts/jobs.sql) and return
+# its ID straight away. A pool of worker processes started with
+#
+#   python jobs.py --processes 4
+#
+# claims queued jobs, runs the registered handler and records progress,
+# results and failures back in the table. Failed jobs are retried with a
+# backoff up to MaxAttempts, running jobs can be cancelled, and
+# Config.JOB_CONCURRENCY caps how many jobs of each type run at once.
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+
+import db_router
+import invalidation
+from config import Config, config_dict
+
+CLAIM_LOCK = 'capstone_job_claim'
+
+JOB_COLUMNS = ("JobID, JobType, Payload, Status, CancelRequested, Progress, Message, Result, "
+               "Attempts, MaxAttempts, CreatedAt, StartedAt, FinishedAt")
+
+# Job type -> handler(ctx, payload), filled in by @job_handler
+HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    # A failure that running the job again would not fix
+    pass
+
+
+# Errors that come back the same on every attempt, so the job fails at once
+PERMANENT_ERRORS = (JobFailed, MySQLdb.IntegrityError, MySQLdb.ProgrammingError)
+
+
+def job_handler(job_type):
+    def register(func):
+        HANDLERS[job_type] = func
+        return func
+    return register
+
+
+# --- Used by the web app -------------------------------------------------------
+
+def enqueue(db, job_type, payload=None, created_by=None, config=None):
+    if job_type not in HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    config = config or config_dict()
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO Job (JobType, Payload, MaxAttempts, CreatedBy) VALUES (%s, %s, %s, %s)",
+                   (job_type, json.dumps(payload or {}), config['JOB_MAX_ATTEMPTS'], created_by))
+    db.commit()
+    return cursor.lastrowid
+
+
+def get_job(db, job_id):
+    cursor = db.cursor(MySQLdb.cursors.DictCursor)
+    cursor.execute(f"SELECT {JOB_COLUMNS} FROM Job WHERE JobID = %s", (job_id,))
+    job = cursor.fetchone()
+    if job:
+        job['Payload'] = json.loads(job['Payload']) if job['Payload'] else {}
+        job['Result'] = json.loads(job['Result']) if job['Result'] else None
+        job['CancelRequested'] = bool(job['CancelRequested'])
+    return job
+
+
+def cancel(db, job_id):
+    cursor = db.cursor()
+    # Queued jobs are cancelled outright, running ones stop at their next progress report
+    cursor.execute("UPDATE Job SET Status = 'cancelled', FinishedAt = NOW() "
+                   "WHERE JobID = %s AND Status = 'queued'", (job_id,))
+    if not cursor.rowcount:
+        cursor.execute("UPDATE Job SET CancelRequested = TRUE WHERE JobID = %s AND Status = 'running'",
+                       (job_id,))
+    db.commit()
+    return cursor.rowcount > 0
+
+
+def retry(db, job_id):
+    cursor = db.cursor()
+    cursor.execute("""
+        UPDATE Job SET Status = 'queued', Attempts = 0, Progress = 0, Message = NULL,
+                       CancelRequested = FALSE, RunAfter = NOW(), FinishedAt = NULL
+        WHERE JobID = %s AND Status IN ('failed', 'cancelled')
+    """, (job_id,))
+    db.commit()
+    return cursor.rowcount > 0
+
+
+# --- Worker side ---------------------------------------------------------------
+
+class JobContext:
+    def __init__(self, db, job_id, config):
+        self.db = db
+        self.job_id = job_id
+        self.config = config
+
+    def progress(self, percent, message=None):
+        # Also serves as the heartbeat and the cancellation check
+        cursor = self.db.cursor()
+        cursor.execute("UPDATE Job SET Progress = %s, Message = %s, HeartbeatAt = NOW() WHERE JobID = %s",
+                       (int(percent), message, self.job_id))
+        cursor.execute("SELECT CancelRequested FROM Job WHERE JobID = %s", (self.job_id,))
+        cancel_requested = cursor.fetchone()[0]
+        self.db.commit()
+        if cancel_requested:
+            raise JobCancelled()
+
+    def heartbeat(self):
+        # For handlers blocked in one long statement that can't report progress
+        return Heartbeat(self.config, self.job_id)
+
+
+class Heartbeat(threading.Thread):
+    # Keeps HeartbeatAt fresh from a second connection, the job's own
+    # connection is busy running the statement
+    def __init__(self, config, job_id):
+        super().__init__(daemon=True)
+        self.config = config
+        self.job_id = job_id
+        self.interval = config['JOB_HEARTBEAT_TIMEOUT'] / 4
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self.join()
+
+    def run(self):
+        db = None
+        while not self._stopped.wait(self.interval):
+            try:
+                db = db or db_router.connect_primary(self.config)
+                cursor = db.cursor()
+                cursor.execute("UPDATE Job SET HeartbeatAt = NOW() WHERE JobID = %s AND Status = 'running'",
+                               (self.job_id,))
+                db.commit()
+            except MySQLdb.Error as e:
+                print(f"Heartbeat for job {self.job_id} failed: {e}")
+                db = None
+        if db is not None:
+            db.close()
+
+
+def _requeue_stale_jobs(cursor, config):
+    # A worker that stopped heartbeating has died, give its job back to the
+    # queue unless it has used up its attempts (a job that keeps killing its
+    # worker must not run forever)
+    cursor.execute("""
+        UPDATE Job SET
+            Status = IF(Attempts < MaxAttempts, 'queued', 'failed'),
+            FinishedAt = IF(Attempts < MaxAttempts, NULL, NOW()),
+            Message = IF(Attempts < MaxAttempts, 'Worker lost, requeued', 'Worker lost, no attempts left')
+        WHERE Status = 'running' AND HeartbeatAt < NOW() - INTERVAL %s SECOND
+    """, (config['JOB_HEARTBEAT_TIMEOUT'],))
+
+
+def claim(db, config):
+    cursor = db.cursor()
+    # Claims are serialized so the per-type concurrency limits hold across workers
+    cursor.execute("SELECT GET_LOCK(%s, 10)", (CLAIM_LOCK,))
+    if not cursor.fetchone()[0]:
+        return None
+    try:
+        _requeue_stale_jobs(cursor, config)
+
+        cursor.execute("SELECT JobType, COUNT(*) FROM Job WHERE Status = 'running' GROUP BY JobType")
+        running = dict(cursor.fetchall())
+        limits = config['JOB_CONCURRENCY']
+        full = [t for t, n in running.items() if n >= limits.get(t, config['JOB_DEFAULT_CONCURRENCY'])]
+
+        query = "SELECT JobID, JobType, Payload FROM Job WHERE Status = 'queued' AND RunAfter <= NOW()"
+        if full:
+            query += " AND JobType NOT IN (%s)" % ', '.join(['%s'] * len(full))
+        cursor.execute(query + " ORDER BY JobID LIMIT 1", tuple(full))
+        job = cursor.fetchone()
+
+        if job:
+            cursor.execute("""
+                UPDATE Job SET Status = 'running', Attempts = Attempts + 1, CancelRequested = FALSE,
+                               StartedAt = NOW(), HeartbeatAt = NOW()
+                WHERE JobID = %s
+            """, (job[0],))
+        db.commit()
+        return job
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (CLAIM_LOCK,))
+        cursor.fetchall()
+
+
+def run_job(db, job, config):
+    job_id, job_type, payload = job
+    cursor = db.cursor()
+    try:
+        result = HANDLERS[job_type](JobContext(db, job_id, config), json.loads(payload or '{}'))
+    except JobCancelled:
+        db.rollback()
+        cursor.execute("UPDATE Job SET Status = 'cancelled', FinishedAt = NOW() WHERE JobID = %s", (job_id,))
+    except PERMANENT_ERRORS as e:
+        db.rollback()
+        print(f"Job {job_id} ({job_type}) failed: {e}")
+        cursor.execute("UPDATE Job SET Status = 'failed', FinishedAt = NOW(), Message = %s WHERE JobID = %s",
+                       (str(e)[:255], job_id))
+    except Exception as e:
+        db.rollback()
+        print(f"Job {job_id} ({job_type}) failed: {e}")
+        cursor.execute("""
+            UPDATE Job SET
+                Status = IF(Attempts < MaxAttempts, 'queued', 'failed'),
+                RunAfter = NOW() + INTERVAL (%s * Attempts) SECOND,
+                FinishedAt = IF(Attempts < MaxAttempts, NULL, NOW()),
+                Message = %s
+            WHERE JobID = %s
+        """, (config['JOB_RETRY_BACKOFF'], str(e)[:255], job_id))
+    else:
+        cursor.execute("""
+            UPDATE Job SET Status = 'succeeded', Progress = 100, Result = %s, FinishedAt = NOW()
+            WHERE JobID = %s
+        """, (json.dumps(result), job_id))
+    db.commit()
+
+
+def worker_loop(config):
+    # Finish the current job before stopping
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    db = db_router.connect_primary(config)
+    while not stopping:
+        try:
+            db.ping()
+            job = claim(db, config)
+            if job:
+                run_job(db, job, config)
+            else:
+                time.sleep(config['JOB_POLL_INTERVAL'])
+        except MySQLdb.OperationalError as e:
+            print(f"Job worker {os.getpid()} lost the database: {e}")
+            time.sleep(config['JOB_POLL_INTERVAL'])
+            db = db_router.connect_primary(config)
+    db.close()
+
+
+# --- Job types -----------------------------------------------------------------
+
+@job_handler('calculate_grades')
+def calculate_grades(ctx, payload):
+    cursor = ctx.db.cursor()
+    ctx.progress(0, 'Calculating grades')
+    with ctx.heartbeat():
+        cursor.callproc('calculate_and_store_grades')
+    invalidation.record_change(cursor, 'StudentGrades')
+    ctx.db.commit()
+    return {'message': 'Grades calculated'}
+
+
+@job_handler('export_students')
+def export_students(ctx, payload):
+    export_dir = ctx.config['JOB_EXPORT_DIR']
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"students_{ctx.job_id}.csv")
+
+    cursor = ctx.db.cursor()
+    cursor.execute("SELECT COUNT(*) FROM Student")
+    total = cursor.fetchone()[0] or 1
+
+    columns = ['SRN', 'Name', 'Email', 'Phone', 'Gender', 'Section', 'Semester', 'GPA',
+               'DeptID', 'TeamID', 'FacultyID']
+    # Stream rows on a second connection so progress can be reported meanwhile
+    stream_db = db_router.connect_primary(ctx.config)
+    try:
+        stream = stream_db.cursor(MySQLdb.cursors.SSCursor)
+        stream.execute(f"SELECT {', '.join(columns)} FROM Student ORDER BY SRN")
+        written = 0
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            while True:
+                rows = stream.fetchmany(1000)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                written += len(rows)
+                ctx.progress(100 * written / total, f"Exported {written} of {total} students")
+        stream.close()
+    finally:
+        stream_db.close()
+    return {'path': path, 'rows': written}
+
+
+@job_handler('bulk_update_teams')
+def bulk_update_teams(ctx, payload):
+    teams = payload.get('teams', [])
+    cursor = ctx.db.cursor()
+    for i, team in enumerate(teams, 1):
+        cursor.execute("UPDATE Team SET ProjectName = %s, Domain = %s, DeptID = %s WHERE TeamID = %s",
+                       (team['project_name'], team['domain'], team['dept_id'], team['team_id']))
+        if team.get('faculty_id'):
+            cursor.execute("UPDATE Student SET FacultyID = %s WHERE TeamID = %s",
+                           (team['faculty_id'], team['team_id']))
+        invalidation.record_change(cursor, 'Team', 'Student')
+        ctx.db.commit()
+        ctx.progress(100 * i / len(teams), f"Updated {i} of {len(teams)} teams")
+    return {'updated': len(teams)}
+
+
+@job_handler('delete_team')
+def delete_team(ctx, payload):
+    team_id = payload['team_id']
+    batch_size = ctx.config['JOB_DELETE_BATCH_SIZE']
+    cursor = ctx.db.cursor()
+
+    # The batches below commit as they go, so refuse up front anything the
+    # final Team delete would fail on: Student.TeamID and Undergoes.ExamID
+    # don't cascade
+    cursor.execute("SELECT COUNT(*) FROM Student WHERE TeamID = %s", (team_id,))
+    students = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM Undergoes WHERE ExamID IN (SELECT ExamID FROM Exam WHERE TeamID = %s)",
+                   (team_id,))
+    marks = cursor.fetchone()[0]
+    ctx.db.commit()
+    if students or marks:
+        raise JobFailed(f"Team {team_id} still has {students} students and {marks} evaluator marks, "
+                        "move or remove them first")
+
+    # Remove the team's exams in small batches instead of one long cascading delete
+    deleted = 0
+    while True:
+        cursor.execute("DELETE FROM Exam WHERE TeamID = %s LIMIT %s", (team_id, batch_size))
+        batch_deleted = cursor.rowcount
+        if batch_deleted:
+            invalidation.record_change(cursor, 'Exam', 'CapstoneMarks')
+        ctx.db.commit()
+        if batch_deleted == 0:
+            break
+        deleted += batch_deleted
+        ctx.progress(50, f"Deleted {deleted} exams")
+
+    cursor.execute("DELETE FROM Team WHERE TeamID = %s", (team_id,))
+    invalidation.record_change(cursor, 'Team')
+    ctx.db.commit()
+    return {'team_id': team_id, 'exams_deleted': deleted}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background job workers')
+    parser.add_argument('--processes', type=int, default=Config.JOB_WORKERS)
+    args = parser.parse_args()
+
+    config = config_dict()
+    workers = [multiprocessing.Process(target=worker_loop, args=(config,)) for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+
+    def stop(*_):
+        for worker in workers:
+            worker.terminate()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+# Per-request tracing and sampling profiler.
+#
+# A request is traced when an admin sends "X-Profile: 1" (or adds ?_profile=1),
+# and any request is traced with probability PROFILE_SAMPLE_RATE. A traced
+# request records a span tree: connect_db(), every cursor execute and fetch,
+# every template render and whatever app code wraps in span(). With
+# "X-Profile: stack" (or PROFILE_SAMPLE_STACKS for sampled requests) a thread
+# also samples the request's Python stack every PROFILE_STACK_INTERVAL seconds.
+#
+# Finished traces are written to PROFILE_DIR as folded stacks, which
+# flamegraph.pl, speedscope and inferno read directly. Each worker keeps the
+# PROFILE_KEEP_SLOWEST slowest traces in memory for /admin/traces, and only the
+# newest PROFILE_KEEP_FILES files are kept on disk. Requests that are not
+# traced only pay for one random() call and a few g lookups.
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import MySQLdb.cursors
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+# Endpoints never worth tracing (and the trace viewer itself)
+UNTRACED_ENDPOINTS = {'static', 'assets', 'admin_traces', 'admin_trace', 'admin_trace_folded'}
+
+
+class Span:
+    __slots__ = ('name', 'detail', 'start', 'end', 'children')
+
+    def __init__(self, name, detail=None):
+        self.name = name
+        self.detail = detail
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def self_time(self):
+        return self.duration - sum(child.duration for child in self.children)
+
+
+class Trace:
+    def __init__(self, method, path, endpoint):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.path = path
+        self.status = None
+        self.root = Span(f"{method} {endpoint or path}", path)
+        self.stacks = {}  # Folded Python stack -> number of samples
+        self.sampler = None
+        self._open = [self.root]
+
+    @property
+    def duration(self):
+        return self.root.duration
+
+    @property
+    def started(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))
+
+    def push(self, name, detail=None):
+        span = Span(name, detail)
+        self._open[-1].children.append(span)
+        self._open.append(span)
+        return span
+
+    def pop(self, span):
+        span.end = time.perf_counter()
+        if span in self._open:
+            # Also closes anything left open inside it, e.g. by an exception
+            while self._open.pop() is not span:
+                pass
+
+    def finish(self):
+        if self.sampler:
+            self.sampler.stop()
+        now = time.perf_counter()
+        for span in self._open:
+            if span.end is None:
+                span.end = now
+        self._open = []
+
+    def walk(self):
+        pending = [(0, self.root)]
+        while pending:
+            depth, span = pending.pop()
+            yield depth, span
+            pending.extend((depth + 1, child) for child in reversed(span.children))
+
+    def folded_spans(self):
+        # One line per span path with its self time in microseconds
+        lines = []
+
+        def visit(span, prefix):
+            path = f"{prefix};{_frame(span.name)}" if prefix else _frame(span.name)
+            self_us = int(span.self_time * 1_000_000)
+            if self_us > 0:
+                lines.append(f"{path} {self_us}")
+            for child in span.children:
+                visit(child, path)
+
+        visit(self.root, '')
+        return '\n'.join(lines) + '\n'
+
+    def folded_stacks(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+def _frame(name):
+    # Folded format separates frames with ';' and the count with the last space
+    return ' '.join(name.split()).replace(';', ',')
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval, counts):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = counts
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                stack = ';'.join(reversed(frames))
+                self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class SlowestTraces:
+    # Keeps the slowest max_entries traces seen by this worker
+    def __init__(self, max_entries=20):
+        self.max_entries = max_entries
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            entry = (trace.duration, next(self._counter), trace)
+            if len(self._heap) < self.max_entries:
+                heapq.heappush(self._heap, entry)
+            elif entry[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def list(self):
+        with self._lock:
+            return [trace for _, _, trace in sorted(self._heap, key=lambda e: e[0], reverse=True)]
+
+    def get(self, trace_id):
+        return next((trace for trace in self.list() if trace.trace_id == trace_id), None)
+
+
+def current_trace():
+    if not has_request_context():
+        return None
+    return g.get('profile_trace')
+
+
+@contextmanager
+def span(name, detail=None):
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    s = trace.push(name, detail)
+    try:
+        yield
+    finally:
+        trace.pop(s)
+
+
+class TracedCursor(MySQLdb.cursors.Cursor):
+    def execute(self, query, args=None):
+        sql = query.decode() if isinstance(query, bytes) else query
+        with span(f"execute {' '.join(sql.split())[:80]}", sql):
+            return super().execute(query, args)
+
+    def executemany(self, query, args):
+        sql = query.decode() if isinstance(query, bytes) else query
+        with span(f"executemany {' '.join(sql.split())[:80]}", sql):
+            return super().executemany(query, args)
+
+    def fetchone(self):
+        with span('fetchone'):
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        with span('fetchmany'):
+            return super().fetchmany(size)
+
+    def fetchall(self):
+        with span('fetchall'):
+            return super().fetchall()
+
+
+def instrument(db):
+    # Cursors of a traced request record their statements and fetches
+    if current_trace() is not None:
+        db.cursorclass = TracedCursor
+    return db
+
+
+def write_trace(directory, trace, keep_files):
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(trace.started_at))
+    base = os.path.join(directory, f"{stamp}-{trace.trace_id}")
+    with open(base + '.spans.folded', 'w') as f:
+        f.write(trace.folded_spans())
+    if trace.stacks:
+        with open(base + '.stacks.folded', 'w') as f:
+            f.write(trace.folded_stacks())
+    prune_traces(directory, keep_files)
+
+
+def prune_traces(directory, keep_files):
+    # A sample rate left on would otherwise fill the disk
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.folded'):
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass  # Another worker pruned it first
+    files.sort()
+    for _, path in files[:max(0, len(files) - keep_files)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def init_app(app, allow):
+    # allow() says whether the current user may ask for a trace
+    slowest = SlowestTraces(app.config['PROFILE_KEEP_SLOWEST'])
+
+    @app.before_request
+    def start_trace():
+        if request.endpoint in UNTRACED_ENDPOINTS:
+            return
+        flag = request.headers.get('X-Profile') or request.args.get('_profile')
+        if flag and allow():
+            sample_stacks = flag == 'stack'
+        elif random.random() < app.config['PROFILE_SAMPLE_RATE']:
+            sample_stacks = app.config['PROFILE_SAMPLE_STACKS']
+        else:
+            return
+
+        trace = Trace(request.method, request.path, request.endpoint)
+        g.profile_trace = trace
+        if sample_stacks:
+            trace.sampler = StackSampler(threading.get_ident(), app.config['PROFILE_STACK_INTERVAL'],
+                                         trace.stacks)
+            trace.sampler.start()
+
+    def render_started(sender, template, context, **extra):
+        trace = current_trace()
+        if trace is not None:
+            g.setdefault('profile_render_spans', []).append(trace.push(f"render {template.name or '<string>'}"))
+
+    def render_finished(sender, template, context, **extra):
+        trace = current_trace()
+        if trace is not None and g.get('profile_render_spans'):
+            trace.pop(g.profile_render_spans.pop())
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.after_request
+    def tag_response(response):
+        trace = current_trace()
+        if trace is not None:
+            trace.status = response.status_code
+            response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        trace = g.pop('profile_trace', None)
+        if trace is None:
+            return
+        trace.finish()
+        if trace.status is None:
+            trace.status = 500
+        slowest.add(trace)
+        if app.config['PROFILE_DIR']:
+            try:
+                write_trace(app.config['PROFILE_DIR'], trace, app.config['PROFILE_KEEP_FILES'])
+            except OSError as e:
+                app.logger.warning("Could not write trace %s: %s", trace.trace_id, e)
+
+    return slowest
@@ -0,0 +1,248 @@
+# Data access for Student, Faculty, Admin, Team, Panel, Exam and marks.
+#
+# Each query names exactly the columns its use case needs (listings never
+# carry bcrypt hashes) and returns namedtuple rows: they are plain tuples
+# underneath, so a row costs no more than the driver's own tuple while
+# templates and routes can use names instead of positions.
+#
+# Statement text is kept in module constants, and batch lookups pad their IN
+# lists to a few fixed sizes, so the server sees a small, stable set of
+# statements.
+#
+# Marks and grades of archived terms live in the Archive_* tables (see
+# archive.py). Reads that take include_archived=True UNION ALL them in, every
+# other read only touches the hot tables.
+from collections import namedtuple
+
+StudentLogin = namedtuple('StudentLogin', 'srn password')
+FacultyLogin = namedtuple('FacultyLogin', 'faculty_id password')
+AdminLogin = namedtuple('AdminLogin', 'admin_id password')
+
+StudentRow = namedtuple('StudentRow', 'srn name email phone gender section semester gpa '
+                                      'dept_id team_id faculty_id')
+FacultyRow = namedtuple('FacultyRow', 'faculty_id name designation panel_id email')
+TeamRow = namedtuple('TeamRow', 'team_id project_name domain dept_id supervisor')
+PanelRow = namedtuple('PanelRow', 'panel_id panel_name dept_id')
+DepartmentRow = namedtuple('DepartmentRow', 'dept_id dept_name')
+ExamRow = namedtuple('ExamRow', 'exam_id exam_name max_marks exam_date exam_time team_id')
+MarkRow = namedtuple('MarkRow', 'srn exam_id faculty_id marks_obtained')
+ExamMarkRow = namedtuple('ExamMarkRow', 'faculty_id marks_obtained')
+ExamResultRow = namedtuple('ExamResultRow', 'exam_id exam_name total_marks term')
+GradeRow = namedtuple('GradeRow', 'semester total_marks grade')
+
+STUDENT_COLUMNS = "SRN, Name, Email, Phone, Gender, Section, Semester, GPA, DeptID, TeamID, FacultyID"
+FACULTY_COLUMNS = "FacultyID, FacultyName, Designation, PanelID, email"
+EXAM_COLUMNS = "ExamID, ExamName, MaxMarksAllotted, exam_date, exam_time, TeamID"
+MARK_COLUMNS = "SRN, ExamID, FacultyID, MarksObtained"
+
+STUDENT_LOGIN_SQL = "SELECT SRN, Password FROM Student WHERE Email = %s"
+FACULTY_LOGIN_SQL = "SELECT FacultyID, Password FROM Faculty WHERE Email = %s"
+ADMIN_LOGIN_SQL = "SELECT AdminID, Password FROM Admin WHERE Email = %s"
+
+STUDENT_EXISTS_SQL = "SELECT 1 FROM Student WHERE SRN = %s"
+FACULTY_EXISTS_SQL = "SELECT 1 FROM Faculty WHERE FacultyID = %s"
+ADMIN_EXISTS_SQL = "SELECT 1 FROM Admin WHERE AdminID = %s"
+
+STUDENTS_SQL = f"SELECT {STUDENT_COLUMNS} FROM Student"
+STUDENTS_BY_SRN_SQL = f"SELECT {STUDENT_COLUMNS} FROM Student WHERE SRN IN ({{}})"
+FACULTY_SQL = f"SELECT {FACULTY_COLUMNS} FROM Faculty"
+FACULTY_BY_ID_SQL = f"SELECT {FACULTY_COLUMNS} FROM Faculty WHERE FacultyID IN ({{}})"
+TEAMS_SQL = """
+    SELECT Team.TeamID, Team.ProjectName, Team.Domain, Team.DeptID, Faculty.FacultyName
+    FROM Team
+    LEFT JOIN (
+        SELECT DISTINCT TeamID, FacultyID FROM Student
+    ) AS student_faculty ON Team.TeamID = student_faculty.TeamID
+    LEFT JOIN Faculty ON student_faculty.FacultyID = Faculty.FacultyID
+"""
+PANELS_SQL = "SELECT PanelID, PanelName, DeptID FROM Panel"
+PANELS_BY_ID_SQL = "SELECT PanelID, PanelName, DeptID FROM Panel WHERE PanelID IN ({})"
+DEPARTMENTS_SQL = "SELECT DeptID, DeptName FROM Department"
+EXAMS_SQL = f"SELECT {EXAM_COLUMNS} FROM Exam ORDER BY ExamID DESC"
+EXAMS_BY_ID_SQL = f"SELECT {EXAM_COLUMNS} FROM Exam WHERE ExamID IN ({{}})"
+MARKS_SQL = "SELECT FacultyID, MarksObtained FROM Undergoes WHERE SRN = %s AND ExamID = %s"
+MARKS_BY_SRN_SQL = f"SELECT {MARK_COLUMNS} FROM Undergoes WHERE SRN IN ({{}})"
+ARCHIVED_MARKS_SQL = (f"{MARKS_SQL} UNION ALL "
+                      "SELECT FacultyID, MarksObtained FROM Archive_Undergoes WHERE SRN = %s AND ExamID = %s")
+EXAM_RESULTS_SQL = """
+    SELECT Exam.ExamID, Exam.ExamName, CapstoneMarks.TotalMarks, Exam.Term
+    FROM Exam JOIN CapstoneMarks ON Exam.ExamID = CapstoneMarks.ExamID
+    WHERE CapstoneMarks.SRN = %s
+"""
+ARCHIVED_EXAM_RESULTS_SQL = EXAM_RESULTS_SQL + """
+    UNION ALL
+    SELECT Archive_Exam.ExamID, Archive_Exam.ExamName, Archive_CapstoneMarks.TotalMarks, Archive_Exam.Term
+    FROM Archive_Exam JOIN Archive_CapstoneMarks
+        ON Archive_Exam.Term = Archive_CapstoneMarks.Term AND Archive_Exam.ExamID = Archive_CapstoneMarks.ExamID
+    WHERE Archive_CapstoneMarks.SRN = %s
+"""
+GRADES_SQL = "SELECT Semester, Total_marks_in_sem, Grade FROM StudentGrades WHERE SRN = %s"
+ARCHIVED_GRADES_SQL = (f"{GRADES_SQL} UNION ALL "
+                       "SELECT Semester, Total_marks_in_sem, Grade FROM Archive_StudentGrades WHERE SRN = %s "
+                       "ORDER BY Semester")
+INSERT_MARKS_SQL = f"INSERT INTO Undergoes ({MARK_COLUMNS}) VALUES (%s, %s, %s, %s)"
+
+DELETE_STUDENTS_SQL = "DELETE FROM Student WHERE SRN IN ({})"
+DELETE_FACULTY_SQL = "DELETE FROM Faculty WHERE FacultyID IN ({})"
+
+# Fields the admin batch endpoints may change -> column
+STUDENT_UPDATE_COLUMNS = {'name': 'Name', 'email': 'Email', 'phone': 'Phone', 'gender': 'Gender',
+                          'section': 'Section', 'semester': 'Semester', 'gpa': 'GPA', 'deptID': 'DeptID',
+                          'teamID': 'TeamID', 'facultyID': 'FacultyID', 'password': 'Password'}
+FACULTY_UPDATE_COLUMNS = {'name': 'FacultyName', 'designation': 'Designation', 'panel_id': 'PanelID',
+                          'email': 'email', 'password': 'Password'}
+# Fields that must parse as numbers, the rest are strings
+STUDENT_NUMERIC_FIELDS = {'semester': int, 'gpa': float, 'deptID': int, 'teamID': int, 'facultyID': int}
+FACULTY_NUMERIC_FIELDS = {'panel_id': int}
+
+# IN lists are padded up to one of these sizes
+BATCH_SIZES = (1, 8, 32, 128, 512)
+
+
+def _fetch_one(cursor, row_type, sql, args=()):
+    cursor.execute(sql, args)
+    row = cursor.fetchone()
+    return row_type._make(row) if row else None
+
+
+def _fetch_all(cursor, row_type, sql, args=()):
+    cursor.execute(sql, args)
+    return list(map(row_type._make, cursor.fetchall()))
+
+
+def _fetch_by_keys(cursor, row_type, sql, keys):
+    keys = list(dict.fromkeys(keys))  # Drop duplicates, keep order
+    rows = []
+    while keys:
+        size = next((n for n in BATCH_SIZES if n >= len(keys)), BATCH_SIZES[-1])
+        chunk, keys = keys[:size], keys[size:]
+        # Repeating the last key keeps the statement text the same for this size
+        padded = chunk + [chunk[-1]] * (size - len(chunk))
+        rows.extend(_fetch_all(cursor, row_type, sql.format(', '.join(['%s'] * size)), padded))
+    return rows
+
+
+# --- Authentication ----------------------------------------------------------
+
+def student_login(cursor, email):
+    return _fetch_one(cursor, StudentLogin, STUDENT_LOGIN_SQL, (email,))
+
+
+def faculty_login(cursor, email):
+    return _fetch_one(cursor, FacultyLogin, FACULTY_LOGIN_SQL, (email,))
+
+
+def admin_login(cursor, email):
+    return _fetch_one(cursor, AdminLogin, ADMIN_LOGIN_SQL, (email,))
+
+
+def student_exists(cursor, srn):
+    cursor.execute(STUDENT_EXISTS_SQL, (srn,))
+    return cursor.fetchone() is not None
+
+
+def faculty_exists(cursor, faculty_id):
+    cursor.execute(FACULTY_EXISTS_SQL, (faculty_id,))
+    return cursor.fetchone() is not None
+
+
+def admin_exists(cursor, admin_id):
+    cursor.execute(ADMIN_EXISTS_SQL, (admin_id,))
+    return cursor.fetchone() is not None
+
+
+# --- Students and faculty ----------------------------------------------------
+
+def list_students(cursor):
+    return _fetch_all(cursor, StudentRow, STUDENTS_SQL)
+
+
+def students_by_srns(cursor, srns):
+    return _fetch_by_keys(cursor, StudentRow, STUDENTS_BY_SRN_SQL, srns)
+
+
+def list_faculty(cursor):
+    return _fetch_all(cursor, FacultyRow, FACULTY_SQL)
+
+
+def faculty_by_ids(cursor, faculty_ids):
+    return _fetch_by_keys(cursor, FacultyRow, FACULTY_BY_ID_SQL, faculty_ids)
+
+
+def _update(cursor, table, key_column, keys, columns, fields):
+    # Sets the same fields on every row in keys. fields holds only what the
+    # caller wants changed, named as in columns.
+    assignments = ', '.join(f"{columns[name]} = %s" for name in fields)
+    cursor.execute(f"UPDATE {table} SET {assignments} WHERE {key_column} IN ({', '.join(['%s'] * len(keys))})",
+                   list(fields.values()) + list(keys))
+
+
+def update_students(cursor, srns, fields):
+    _update(cursor, 'Student', 'SRN', srns, STUDENT_UPDATE_COLUMNS, fields)
+
+
+def update_faculty(cursor, faculty_ids, fields):
+    _update(cursor, 'Faculty', 'FacultyID', faculty_ids, FACULTY_UPDATE_COLUMNS, fields)
+
+
+def delete_students(cursor, srns):
+    cursor.execute(DELETE_STUDENTS_SQL.format(', '.join(['%s'] * len(srns))), srns)
+
+
+def delete_faculty(cursor, faculty_ids):
+    cursor.execute(DELETE_FACULTY_SQL.format(', '.join(['%s'] * len(faculty_ids))), faculty_ids)
+
+
+# --- Teams, panels, departments and exams -----------------------------------
+
+def list_teams(cursor):
+    return _fetch_all(cursor, TeamRow, TEAMS_SQL)
+
+
+def list_panels(cursor):
+    return _fetch_all(cursor, PanelRow, PANELS_SQL)
+
+
+def panels_by_ids(cursor, panel_ids):
+    return _fetch_by_keys(cursor, PanelRow, PANELS_BY_ID_SQL, panel_ids)
+
+
+def list_departments(cursor):
+    return _fetch_all(cursor, DepartmentRow, DEPARTMENTS_SQL)
+
+
+def list_exams(cursor):
+    return _fetch_all(cursor, ExamRow, EXAMS_SQL)
+
+
+def exams_by_ids(cursor, exam_ids):
+    return _fetch_by_keys(cursor, ExamRow, EXAMS_BY_ID_SQL, exam_ids)
+
+
+# --- Marks -------------------------------------------------------------------
+
+def marks_for(cursor, srn, exam_id, include_archived=False):
+    if include_archived:
+        return _fetch_all(cursor, ExamMarkRow, ARCHIVED_MARKS_SQL, (srn, exam_id, srn, exam_id))
+    return _fetch_all(cursor, ExamMarkRow, MARKS_SQL, (srn, exam_id))
+
+
+def marks_by_srns(cursor, srns):
+    return _fetch_by_keys(cursor, MarkRow, MARKS_BY_SRN_SQL, srns)
+
+
+def exam_results_for(cursor, srn, include_archived=False):
+    if include_archived:
+        return _fetch_all(cursor, ExamResultRow, ARCHIVED_EXAM_RESULTS_SQL, (srn, srn))
+    return _fetch_all(cursor, ExamResultRow, EXAM_RESULTS_SQL, (srn,))
+
+
+def grades_for(cursor, srn, include_archived=False):
+    if include_archived:
+        return _fetch_all(cursor, GradeRow, ARCHIVED_GRADES_SQL, (srn, srn))
+    return _fetch_all(cursor, GradeRow, GRADES_SQL, (srn,))
+
+
+def insert_marks(cursor, srn, exam_id, faculty_id, marks_obtained):
+    # Fires the Undergoes triggers that maintain CapstoneMarks and StudentGrades
+    cursor.execute(INSERT_MARKS_SQL, (srn, exam_id, faculty_id, marks_obtained))
@@ -0,0 +1,310 @@
+# Read-only SQLite snapshot of the dashboard data.
+#
+# On result day the student and faculty dashboards are almost all of the
+# traffic, and what they show barely changes. One exporter per box
+#
+#   python snapshot.py           # refresh every SNAPSHOT_REFRESH_INTERVAL seconds
+#   python snapshot.py --once
+#
+# copies Team, Student, Faculty, Exam, CapstoneMarks and StudentGrades into a
+# SQLite file at SNAPSHOT_PATH. Refreshes are incremental: the exporter tails
+# ChangeOutbox (see invalidation.py) and only re-copies the tables that were
+# written since its last position. Every refresh builds a new file and swaps
+# it in with os.replace(), so readers never see a half-written snapshot and
+# the file never changes under an open connection.
+#
+# With SNAPSHOT_MODE on, web workers serve the dashboards from the snapshot
+# and MySQL only takes writes. The file's mtime is the moment its data was
+# read from MySQL. When it is older than SNAPSHOT_MAX_STALENESS (the exporter
+# stopped, say), workers go back to MySQL.
+import argparse
+import datetime
+import decimal
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g
+
+import invalidation
+from config import config_dict
+
+# Bump when SNAPSHOT_TABLES changes, the next refresh then rebuilds the file
+SCHEMA_VERSION = 1
+
+# Table -> (SQLite DDL, MySQL query). Column names match MySQL so the
+# dashboard queries run unchanged. No password hashes.
+SNAPSHOT_TABLES = {
+    'Team': ("CREATE TABLE Team (TeamID INTEGER PRIMARY KEY, ProjectName TEXT, Domain TEXT, DeptID INTEGER)",
+             "SELECT TeamID, ProjectName, Domain, DeptID FROM Team"),
+    'Student': ("CREATE TABLE Student (SRN TEXT PRIMARY KEY, Name TEXT, Email TEXT, Phone TEXT, Gender TEXT, "
+                "Section TEXT, Semester INTEGER, GPA REAL, DeptID INTEGER, TeamID INTEGER, FacultyID INTEGER)",
+                "SELECT SRN, Name, Email, Phone, Gender, Section, Semester, GPA, DeptID, TeamID, FacultyID "
+                "FROM Student"),
+    'Faculty': ("CREATE TABLE Faculty (FacultyID INTEGER PRIMARY KEY, FacultyName TEXT, Designation TEXT, "
+                "PanelID INTEGER, email TEXT)",
+                "SELECT FacultyID, FacultyName, Designation, PanelID, email FROM Faculty"),
+    'Exam': ("CREATE TABLE Exam (ExamID INTEGER PRIMARY KEY, ExamName TEXT, MaxMarksAllotted INTEGER, "
+             "exam_date TEXT, exam_time TEXT, TeamID INTEGER, Term TEXT)",
+             "SELECT ExamID, ExamName, MaxMarksAllotted, exam_date, exam_time, TeamID, Term FROM Exam"),
+    'CapstoneMarks': ("CREATE TABLE CapstoneMarks (SRN TEXT, ExamID INTEGER, TotalMarks INTEGER, "
+                      "PRIMARY KEY (SRN, ExamID))",
+                      "SELECT SRN, ExamID, TotalMarks FROM CapstoneMarks"),
+    'StudentGrades': ("CREATE TABLE StudentGrades (SRN TEXT, Semester INTEGER, Total_marks_in_sem INTEGER, "
+                      "Grade TEXT, PRIMARY KEY (SRN, Semester))",
+                      "SELECT SRN, Semester, Total_marks_in_sem, Grade FROM StudentGrades"),
+}
+
+SNAPSHOT_INDEXES = [
+    "CREATE INDEX idx_student_team ON Student (TeamID)",
+    "CREATE INDEX idx_student_faculty ON Student (FacultyID)",
+    "CREATE INDEX idx_exam_team ON Exam (TeamID)",
+]
+
+FETCH_SIZE = 5000
+
+
+def _sqlite_value(value):
+    # Store values the way the dashboards print them from MySQL
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):  # MySQL TIME
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+# --- Exporter ------------------------------------------------------------------
+
+def _schema_version(path):
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.OperationalError:
+        return None
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        conn.close()
+
+
+def _changed_tables(config, cursor, position):
+    # Same gap rule as the invalidation dispatcher: an unsettled gap may still
+    # be filled by a slower transaction, so the position stops before it
+    cursor.execute("SELECT EventID, TableName, CreatedAt < NOW(3) - INTERVAL %s SECOND "
+                   "FROM ChangeOutbox WHERE EventID > %s ORDER BY EventID",
+                   (config['OUTBOX_GAP_TIMEOUT'], position))
+    tables = set()
+    expected = position + 1
+    contiguous = True
+    for event_id, table, settled in cursor.fetchall():
+        # Tables past a gap are copied too, the data read is newer anyway
+        tables.add(table)
+        if contiguous and (event_id == expected or settled):
+            position = event_id
+            expected = event_id + 1
+        else:
+            contiguous = False
+    return tables, position
+
+
+def _copy_table(cursor, out, table):
+    _, query = SNAPSHOT_TABLES[table]
+    out.execute(f"DELETE FROM {table}")
+    cursor.execute(query)
+    rows = 0
+    while True:
+        batch = cursor.fetchmany(FETCH_SIZE)
+        if not batch:
+            break
+        placeholders = ', '.join(['?'] * len(batch[0]))
+        out.executemany(f"INSERT INTO {table} VALUES ({placeholders})",
+                        [tuple(map(_sqlite_value, row)) for row in batch])
+        rows += len(batch)
+    out.execute("INSERT OR REPLACE INTO snapshot_tables (name, exported_at, row_count) VALUES (?, ?, ?)",
+                (table, time.time(), rows))
+    return rows
+
+
+def refresh(config, db):
+    path = config['SNAPSHOT_PATH']
+    position_path = path + '.position'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    cursor = db.cursor()
+
+    # All tables are read from one consistent view of the database
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+    read_at = time.time()
+    try:
+        position = invalidation.load_position(position_path)
+        try:
+            confirmed_at = os.stat(path).st_mtime
+        except FileNotFoundError:
+            confirmed_at = None
+        # Events older than OUTBOX_RETENTION_SECONDS are pruned, past that we
+        # can't know what changed
+        full = (position is None or confirmed_at is None
+                or _schema_version(path) != SCHEMA_VERSION
+                or read_at - confirmed_at > config['OUTBOX_RETENTION_SECONDS'] - config['OUTBOX_GAP_TIMEOUT'])
+        if full:
+            cursor.execute("SELECT COALESCE(MIN(EventID) - 1, 0) FROM ChangeOutbox")
+            position = cursor.fetchone()[0]
+
+        changed, new_position = _changed_tables(config, cursor, position)
+        tables = list(SNAPSHOT_TABLES) if full else [t for t in SNAPSHOT_TABLES if t in changed]
+
+        if tables:
+            tmp = path + '.building'
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            out = sqlite3.connect(tmp)
+            try:
+                # Only the finished file matters, skip the journal
+                out.execute("PRAGMA journal_mode = OFF")
+                out.execute("PRAGMA synchronous = OFF")
+                if full:
+                    for ddl, _ in SNAPSHOT_TABLES.values():
+                        out.execute(ddl)
+                    for ddl in SNAPSHOT_INDEXES:
+                        out.execute(ddl)
+                    out.execute("CREATE TABLE snapshot_tables "
+                                "(name TEXT PRIMARY KEY, exported_at REAL, row_count INTEGER)")
+                    out.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                else:
+                    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                    source.backup(out)
+                    source.close()
+                counts = {table: _copy_table(cursor, out, table) for table in tables}
+                out.commit()
+            finally:
+                out.close()
+            os.replace(tmp, path)
+            print(f"Snapshot {'rebuilt' if full else 'refreshed'}: "
+                  + ', '.join(f"{table} ({rows} rows)" for table, rows in counts.items()))
+    finally:
+        db.rollback()
+
+    # The data is now as of read_at, which is what readers measure staleness by
+    os.utime(path, (read_at, read_at))
+    if new_position != position or full:
+        invalidation.save_position(position_path, new_position)
+
+
+def export_forever(config, once=False):
+    import db_router  # Only the exporter needs MySQLdb
+
+    db = db_router.connect_primary(config)
+    while True:
+        started = time.monotonic()
+        refresh(config, db)
+        if once:
+            break
+        time.sleep(max(0, config['SNAPSHOT_REFRESH_INTERVAL'] - (time.monotonic() - started)))
+    db.close()
+
+
+# --- Web worker side -------------------------------------------------------------
+
+class SnapshotCursor:
+    # Accepts the MySQL-style statements and %s parameters the routes use
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, args=()):
+        return self._cursor.execute(query.replace('%s', '?'), [_sqlite_value(arg) for arg in args])
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SnapshotConnection:
+    def __init__(self, conn, age):
+        self._conn = conn
+        self.age = age
+
+    def cursor(self):
+        return SnapshotCursor(self._conn.cursor())
+
+    def close(self):
+        pass  # Kept open per thread until the snapshot is replaced
+
+
+class SnapshotReader:
+    def __init__(self, path, max_staleness):
+        self.path = path
+        self.max_staleness = max_staleness
+        self._local = threading.local()
+        self.served = 0
+        self.fallbacks = 0
+
+    def connect(self):
+        # A snapshot connection, or None when the caller should use MySQL
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.fallbacks += 1
+            return None
+        age = time.time() - stat.st_mtime
+        if age > self.max_staleness:
+            self.fallbacks += 1
+            return None
+
+        local = self._local
+        if getattr(local, 'inode', None) != stat.st_ino:
+            # The exporter swapped in a new file, the old inode stays valid until closed
+            if getattr(local, 'conn', None) is not None:
+                local.conn.close()
+            local.conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True,
+                                         check_same_thread=False)
+            local.inode = stat.st_ino
+        self.served += 1
+        return SnapshotConnection(local.conn, age)
+
+    def status(self):
+        status = {'path': self.path, 'max_staleness': self.max_staleness,
+                  'served': self.served, 'fallbacks': self.fallbacks}
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return dict(status, available=False)
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True)
+        try:
+            tables = {name: {'exported_at': exported_at, 'rows': rows} for name, exported_at, rows
+                      in conn.execute("SELECT name, exported_at, row_count FROM snapshot_tables")}
+        finally:
+            conn.close()
+        age = time.time() - stat.st_mtime
+        return dict(status, available=age <= self.max_staleness, age=round(age, 3),
+                    data_as_of=stat.st_mtime, size=stat.st_size, tables=tables)
+
+
+def init_app(app):
+    reader = SnapshotReader(app.config['SNAPSHOT_PATH'], app.config['SNAPSHOT_MAX_STALENESS'])
+
+    @app.after_request
+    def report_staleness(response):
+        age = g.get('snapshot_age')
+        if age is not None:
+            response.headers['X-Snapshot-Age'] = f"{age:.1f}"
+        return response
+
+    return reader
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the dashboard snapshot')
+    parser.add_argument('--once', action='store_true', help='refresh once and exit')
+    export_forever(config_dict(), parser.parse_args().once)
@@ -0,0 +1,149 @@
+# Login throttling with token buckets.
+#
+# Every login attempt takes one token from the client's IP bucket, and every
+# failed attempt takes one from the account's bucket. Attempts are checked
+# before any database lookup or bcrypt work, so a retry storm costs a dict
+# lookup per request instead of a query and a checkpw.
+#
+# The memory backend keeps buckets per worker process. The sqlite backend
+# keeps them in a local file so all workers on the box share the same limits.
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+class MemoryBuckets:
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _refill(self, key, now):
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def peek(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._refill(key, now) >= 1
+
+    def consume(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens = self._refill(key, now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return True
+
+    def _prune(self, now):
+        # Full buckets carry no state, drop them first
+        for key in [k for k in self._buckets if self._refill(k, now) >= self.burst]:
+            del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            # Still too many keys (spread attack), forget the oldest half
+            oldest = sorted(self._buckets, key=lambda k: self._buckets[k][1])
+            for key in oldest[:len(oldest) // 2]:
+                del self._buckets[key]
+
+
+class SqliteBuckets:
+    def __init__(self, rate, burst, path, table, max_keys=100000, prune_every=1000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.table = table
+        self.max_keys = max_keys
+        self.prune_every = prune_every
+        self._consumed = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=1, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                         "(key TEXT PRIMARY KEY, tokens REAL, updated_at REAL) WITHOUT ROWID")
+
+    def _refill(self, key, now):
+        row = self._db.execute(f"SELECT tokens, updated_at FROM {self.table} WHERE key = ?",
+                               (key,)).fetchone()
+        if row is None:
+            return self.burst
+        tokens, updated_at = row
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def peek(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._refill(key, now) >= 1
+
+    def consume(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                tokens = self._refill(key, now)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                self._db.execute(f"INSERT OR REPLACE INTO {self.table} (key, tokens, updated_at) "
+                                 "VALUES (?, ?, ?)", (key, tokens, now))
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            # The table is shared by all workers, a count per consume would cost
+            # more than the bucket itself, so check it now and then
+            self._consumed += 1
+            if self._consumed % self.prune_every == 0:
+                self._prune(now)
+            return allowed
+
+    def _prune(self, now):
+        # Full buckets carry no state, drop them first
+        self._db.execute(f"DELETE FROM {self.table} WHERE tokens + (? - updated_at) * ? >= ?",
+                         (now, self.rate, self.burst))
+        count = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_keys:
+            # Still too many keys (spread attack), forget the oldest half
+            self._db.execute(f"DELETE FROM {self.table} WHERE key IN "
+                             f"(SELECT key FROM {self.table} ORDER BY updated_at LIMIT ?)", (count // 2,))
+
+
+def account_key(role, email):
+    # Fold the email the way the login lookup's collation (utf8mb4_0900_ai_ci)
+    # compares it, so case and accent variants of one account share a bucket
+    folded = unicodedata.normalize('NFKD', email.casefold())
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return f"{role}:{folded.strip()}"
+
+
+class LoginThrottle:
+    def __init__(self, ip_buckets, account_buckets):
+        self.ip_buckets = ip_buckets
+        self.account_buckets = account_buckets
+
+    def allow(self, ip, account):
+        # A locked account is refused without charging the IP
+        if not self.account_buckets.peek(account):
+            return False
+        return self.ip_buckets.consume(ip)
+
+    def failed(self, account):
+        self.account_buckets.consume(account)
+
+
+def create_login_throttle(config):
+    ip_rate, ip_burst = config['LOGIN_IP_RATE'], config['LOGIN_IP_BURST']
+    account_rate, account_burst = config['LOGIN_ACCOUNT_RATE'], config['LOGIN_ACCOUNT_BURST']
+
+    if config.get('LOGIN_THROTTLE_BACKEND') == 'sqlite':
+        path = config['LOGIN_THROTTLE_DB_PATH']
+        return LoginThrottle(SqliteBuckets(ip_rate, ip_burst, path, 'ip_buckets'),
+                             SqliteBuckets(account_rate, account_burst, path, 'account_buckets'))
+    return LoginThrottle(MemoryBuckets(ip_rate, ip_burst),
+                         MemoryBuckets(account_rate, account_burst))
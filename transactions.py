@@ -0,0 +1,112 @@
+# Explicit transactions with retry on deadlock and lock wait timeout.
+#
+# run_in_transaction() runs work(cursor) inside START TRANSACTION ... COMMIT at
+# the requested isolation level. If InnoDB picks the transaction as a deadlock
+# victim or a lock wait times out, everything is rolled back and work() runs
+# again after a randomized exponential backoff ("full jitter"), so colliding
+# writers don't retry in lockstep.
+#
+# apply_each() and apply_batch() run a list of writes inside such a
+# transaction with a savepoint per item, so one bad item (a duplicate email, a
+# row still referenced elsewhere) is reported without undoing the others.
+import random
+import time
+
+import MySQLdb
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+RETRYABLE_ERRORS = {ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK}
+
+ISOLATION_LEVELS = {'READ UNCOMMITTED', 'READ COMMITTED', 'REPEATABLE READ', 'SERIALIZABLE'}
+
+# Errors that only concern one item of a batch. Deadlocks and lock timeouts
+# abort the whole transaction and are left to run_in_transaction().
+ITEM_ERRORS = (MySQLdb.IntegrityError, MySQLdb.DataError)
+
+
+class TransactionStats:
+    __slots__ = ('attempts', 'deadlocks', 'lock_timeouts', 'failed_time', 'backoff_time', 'elapsed')
+
+    def __init__(self):
+        self.attempts = 0
+        self.deadlocks = 0
+        self.lock_timeouts = 0
+        self.failed_time = 0.0   # Seconds spent in attempts that were rolled back
+        self.backoff_time = 0.0  # Seconds slept between attempts
+        self.elapsed = 0.0
+
+    @property
+    def retries(self):
+        return self.attempts - 1
+
+
+def run_in_transaction(db, work, isolation='READ COMMITTED', lock_wait_timeout=None,
+                       max_attempts=5, base_delay=0.02, max_delay=0.5):
+    if isolation not in ISOLATION_LEVELS:
+        raise ValueError(f"Unknown isolation level: {isolation}")
+
+    stats = TransactionStats()
+    started = time.perf_counter()
+    cursor = db.cursor()
+    if lock_wait_timeout is not None:
+        # Fail fast and retry instead of queueing behind a lock for 50 seconds
+        cursor.execute("SET SESSION innodb_lock_wait_timeout = %s", (lock_wait_timeout,))
+
+    while True:
+        stats.attempts += 1
+        attempt_started = time.perf_counter()
+        try:
+            # Earlier reads on this connection may have left a transaction
+            # open, and SET TRANSACTION is refused inside one (error 1568)
+            db.rollback()
+            cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {isolation}")
+            cursor.execute("START TRANSACTION")
+            result = work(cursor)
+            db.commit()
+            stats.elapsed = time.perf_counter() - started
+            return result, stats
+        except MySQLdb.Error as e:
+            db.rollback()
+            code = e.args[0] if e.args else None
+            if code not in RETRYABLE_ERRORS or stats.attempts >= max_attempts:
+                raise
+            if code == ER_LOCK_DEADLOCK:
+                stats.deadlocks += 1
+            else:
+                stats.lock_timeouts += 1
+            stats.failed_time += time.perf_counter() - attempt_started
+        except Exception:
+            db.rollback()
+            raise
+
+        delay = random.uniform(0, min(max_delay, base_delay * 2 ** (stats.attempts - 1)))
+        stats.backoff_time += delay
+        time.sleep(delay)
+
+
+def apply_each(cursor, items, apply):
+    # Returns one error (or None) per item, failed items are rolled back alone
+    errors = []
+    for item in items:
+        # Reusing the name moves the savepoint, no RELEASE needed
+        cursor.execute("SAVEPOINT batch_item")
+        try:
+            apply(cursor, item)
+            errors.append(None)
+        except ITEM_ERRORS as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT batch_item")
+            errors.append(e)
+    return errors
+
+
+def apply_batch(cursor, items, apply_many):
+    # One statement for the whole batch, and only when that fails go item by
+    # item to find out which ones are at fault
+    cursor.execute("SAVEPOINT batch_all")
+    try:
+        apply_many(cursor, items)
+        return [None] * len(items)
+    except ITEM_ERRORS:
+        cursor.execute("ROLLBACK TO SAVEPOINT batch_all")
+    return apply_each(cursor, items, lambda cursor, item: apply_many(cursor, [item]))